@@ -1,4 +1,4 @@
-import asyncio
+import pocketflow
 from pocketflow import Flow, Params
 from nodes import ChainOfThoughtNode
 from search import QwantSearch
@@ -39,6 +39,7 @@ async def main():
     
     print("\nFlow completed.")
     print(f"Final result: {result}")
+    await search_client.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    pocketflow.run(main())
\ No newline at end of file
@@ -1,10 +1,174 @@
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Final, FrozenSet
 from pocketflow import Node, Context, Params
-from utility import call_llm, format_plan_for_prompt
+from utility import acall_llm, format_plan_for_prompt, PlanStep, Thought, TRUNCATED_KEY
 from search import QwantSearch
-from scraper import WebScraper
+from scraper import WebScraper, canonicalize_url
 import asyncio
-import json
+import os
+import re
+import sys
+import time
+import weakref
+from itertools import islice
+import orjson
+
+# Print each thought and plan only on an interactive terminal, unless
+# COT_VERBOSE=1 forces it (e.g. when piping a demo's output to a file).
+VERBOSE = sys.stdout.isatty() or os.environ.get("COT_VERBOSE") == "1"
+
+# Search results are shared process-wide, so the same query issued by
+# another thought, node or BatchFlow run within the TTL is not re-sent.
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "256"))
+
+# normalized query -> (expiry time, parsed results)
+_search_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+# normalized query -> task fetching it, so concurrent duplicates share one request
+_search_inflight: Dict[str, "asyncio.Task[List[Dict[str, Any]]]"] = {}
+
+
+def _normalize_query(query: str) -> str:
+    """
+    Reduce a query to a cache key, ignoring case and runs of whitespace.
+    
+    Word order is kept: "python to rust" and "rust to python" are
+    different searches.
+    """
+    return " ".join(query.lower().split())
+
+
+class _SharedClients:
+    """Search and scraping clients shared by ChainOfThoughtNode.shared() nodes on one loop."""
+    
+    def __init__(self):
+        self.search_client = QwantSearch()
+        self.scraper = WebScraper()
+        self.users = 0
+
+
+# httpx clients are bound to the loop they first run on
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _SharedClients]" = weakref.WeakKeyDictionary()
+
+
+# Static instructions and JSON schema sent as the system prompt. It never
+# changes between calls, so the provider can cache it as a shared prefix.
+_SYSTEM_PROMPT: Final[str] = """You are an expert problem solver using a Chain of Thought approach. 
+You break down complex problems into clear, logical steps and solve them systematically.
+You are thorough, accurate, and verify your work when possible.
+You can search the web for information and use scraped content to inform your answers.
+
+Please provide your response in JSON format with the following structure (strictly follow this schema):
+
+```
+{
+  "current_thinking": "[Your detailed evaluation and thinking for this step - be comprehensive and logical. Reference scraped content when relevant.]",
+  "planning": [
+    {
+      "description": "[Step description - specific and actionable]",
+      "status": "[Pending|Done|Verification Needed|Search Needed]",
+      "result": "[REQUIRED IF STATUS IS DONE: Concise result when status is Done]",
+      "query": "[REQUIRED IF STATUS IS SEARCH NEEDED: Specific search query when status is Search Needed]",
+      "mark": "[REQUIRED IF STATUS IS VERIFICATION NEEDED: Reason for Verification Needed]",
+      "sub_steps": [
+        {
+          "description": "[Sub-step description - specific and actionable]",
+          "status": "[Pending|Done|Search Needed]",
+          "result": "[REQUIRED IF STATUS IS DONE: Concise result when status is Done]",
+          "query": "[REQUIRED IF STATUS IS SEARCH NEEDED: Specific search query when status is Search Needed]"
+        }
+        // ... more sub-steps if needed
+      ]
+    }
+    // ... more steps if needed
+  ],
+  "next_thought_needed": true,
+  "final_answer": "[REQUIRED ONLY WHEN next_thought_needed IS false: Your complete, comprehensive final answer to the original problem]"
+}
+```
+
+IMPORTANT REQUIREMENTS:
+- Status meanings:
+  * "Pending": For steps not yet started
+  * "Done": For completed steps (MUST include "result" field)
+  * "Verification Needed": For steps that need verification (MUST include "mark" field)
+  * "Search Needed": For steps requiring external information (MUST include "query" field)
+- All "Done" steps MUST have a "result" field with a concise result description
+- All "Search Needed" steps MUST have a "query" field with a specific search query
+- All "Verification Needed" steps MUST have a "mark" field with a clear reason
+- When you have completed your analysis and have a comprehensive answer to the original problem:
+  * Set next_thought_needed to false
+  * Provide a "final_answer" field containing your complete, well-structured response to the original problem
+  * The final_answer should synthesize all your findings into a coherent, comprehensive response
+- Ensure all JSON is properly formatted and all fields are correctly filled out
+- When using scraped content, reference the source URL in your thinking
+
+Example of correct "Done" step:
+{
+  "description": "Research Keynesian fiscal policy",
+  "status": "Done",
+  "result": "Keynes advocated for government spending during recessions to stimulate demand"
+}
+
+Example of correct "Search Needed" step:
+{
+  "description": "Research modern applications of Keynesian theory",
+  "status": "Search Needed",
+  "query": "modern applications of Keynesian economic theory 2020s"
+}
+
+Example of final response:
+{
+  "current_thinking": "All steps have been completed and I have a comprehensive understanding...",
+  "planning": [...],
+  "next_thought_needed": false,
+  "final_answer": "This is my complete, comprehensive answer to the original problem..."
+}
+"""
+
+_FIRST_THOUGHT_PROMPT: Final[str] = """This is the first step in solving this problem. Please:
+1. Analyze the problem carefully, identifying key components and requirements
+2. Create a comprehensive initial plan with clear, actionable steps
+3. Begin executing the first step of your plan with detailed reasoning
+4. Update the plan status accordingly with specific results
+5. If you need to search for information, mark the step as "Search Needed" with a specific query
+
+"""
+
+# The previous thought goes between these two, joined rather than
+# formatted so the history is never scanned for braces.
+_CONTINUE_HEADER: Final[str] = "PREVIOUS THOUGHTS AND PLAN:\n"
+_CONTINUE_PROMPT: Final[str] = """
+Based on the previous thought, plan status, search results, and scraped content, please:
+1. Critically evaluate the previous step's reasoning and results for accuracy
+2. Identify any errors, gaps, or issues that need to be addressed
+3. Use the scraped content to inform your answers when relevant
+4. Execute the next pending step in the plan with detailed reasoning
+5. If needed, refine the plan by breaking down complex steps into more granular sub-steps
+6. Update the status of plan steps and record specific, concise results
+7. If you need to search for information, mark steps as "Search Needed" with a specific query
+8. If verification is needed, mark steps as "Verification Needed" with a clear reason
+9. When you have completed all steps and have a comprehensive answer, set next_thought_needed to false and provide a final_answer field with your complete response
+
+"""
+
+
+# A whole line of thinking that mentions "Source:" or "source:"
+_SOURCE_LINE_RE = re.compile(r"^.*[Ss]ource:.*$", re.MULTILINE)
+
+# Top-level fields every LLM response must have, in the order they are reported
+_REQUIRED_FIELDS: Final[Tuple[str, ...]] = ("current_thinking", "planning", "next_thought_needed")
+_REQUIRED_FIELD_SET: Final[FrozenSet[str]] = frozenset(_REQUIRED_FIELDS)
+
+_STATUS_ORDER: Final[Tuple[str, ...]] = ("Pending", "Done", "Verification Needed", "Search Needed")
+_VALID_STATUSES: Final[FrozenSet[str]] = frozenset(_STATUS_ORDER)
+# Status -> (field a plan step with it must fill in, default used by
+# _fix_llm_response when the LLM left it out)
+_FIX: Final[Dict[str, Tuple[str, str]]] = {
+    "Done": ("result", "Completed"),
+    "Search Needed": ("query", "information needed"),
+    "Verification Needed": ("mark", "Verification required"),
+}
+
 
 class ChainOfThoughtNode(Node):
     """
@@ -12,17 +176,71 @@ class ChainOfThoughtNode(Node):
     by maintaining and executing a structured plan with search and scraping capabilities.
     """
     
-    def __init__(self, search_client: Optional[QwantSearch] = None, max_scraped_urls: int = 5):
+    def __init__(
+        self,
+        search_client: Optional[QwantSearch] = None,
+        max_scraped_urls: int = 5,
+        max_concurrent_searches: int = 5,
+        scrape_deadline: Optional[float] = 30.0,
+        max_steps: int = 32,
+        stream: Optional[bool] = None,
+        verbose: Optional[bool] = None,
+        scraper: Optional[WebScraper] = None,
+    ):
         """
         Initialize the ChainOfThoughtNode.
         
         Args:
             search_client: Optional QwantSearch client for web search integration
             max_scraped_urls: Maximum number of URLs to scrape per search query
+            max_concurrent_searches: Maximum number of searches run at once
+            scrape_deadline: Seconds to wait for a thought's pages to be
+                scraped; slower pages are recorded as failed (None waits for all)
+            max_steps: Maximum number of thoughts per run (overridable with a
+                "max_steps" param) before the node stops looping
+            stream: Stream LLM responses, showing them as they are generated;
+                defaults to verbose, since a response nobody watches is
+                cheaper to fetch in one piece
+            verbose: Print each thought and plan; defaults to VERBOSE
+            scraper: Optional WebScraper to use; one is created (and closed
+                by __aexit__) if not given
         """
         self.search_client = search_client or QwantSearch()
+        self._owns_search_client = search_client is None
         self.max_scraped_urls = max_scraped_urls
-        self.scraper = WebScraper()
+        self.max_concurrent_searches = max_concurrent_searches
+        self.scrape_deadline = scrape_deadline
+        self.max_steps = max_steps
+        self.verbose = VERBOSE if verbose is None else verbose
+        self.stream = self.verbose if stream is None else stream
+        self.scraper = scraper or WebScraper()
+        self._owns_scraper = scraper is None
+        self._shared: Optional[_SharedClients] = None
+    
+    @classmethod
+    def shared(cls, **kwargs: Any) -> "ChainOfThoughtNode":
+        """
+        Create a node that reuses this event loop's search and scraping clients.
+        
+        Every node created this way on the same loop shares one QwantSearch
+        and one WebScraper, so its connection pool is set up once for all
+        flows. Both are closed when the last such node exits.
+        Must be called from a running event loop.
+        
+        Args:
+            **kwargs: Other ChainOfThoughtNode arguments
+            
+        Returns:
+            A ChainOfThoughtNode using the shared clients
+        """
+        loop = asyncio.get_running_loop()
+        clients = _shared_clients.get(loop)
+        if clients is None:
+            clients = _shared_clients[loop] = _SharedClients()
+        clients.users += 1
+        node = cls(search_client=clients.search_client, scraper=clients.scraper, **kwargs)
+        node._shared = clients
+        return node
     
     async def __call__(self, ctx: Context, p: Params) -> Tuple[str, Any]:
         """
@@ -50,12 +268,10 @@ class ChainOfThoughtNode(Node):
         thought_number = ctx["current_thought_number"] + 1
         ctx["current_thought_number"] = thought_number
         
-        # Format history of thoughts and the last known plan
+        # History of the last thought and plan, rendered once when it was recorded
         thoughts_history = ""
         if thoughts:
-            last_thought = thoughts[-1]
-            thoughts_history = f"Previous thought #{last_thought['thought_number']}:\n{last_thought['current_thinking']}\n\n"
-            thoughts_history += f"Current plan status:\n{format_plan_for_prompt(last_thought['planning'])}\n\n"
+            thoughts_history = ctx.get("_thought_history") or self._format_thought(thoughts[-1])
         
         # Check if we need to perform any searches
         search_queries = self._extract_search_queries(thoughts)
@@ -69,81 +285,108 @@ class ChainOfThoughtNode(Node):
             ctx["scraped_content"].update(scraped_content)
             
             # Add search results and scraped content to thoughts history
-            thoughts_history += f"Recent search results:\n{self._format_search_results(search_results)}\n\n"
+            search_blocks = ctx.setdefault("_search_blocks", {})
+            thoughts_history += f"Recent search results:\n{self._format_search_results(search_results, search_blocks)}\n\n"
             thoughts_history += f"Scraped content from top results:\n{self._format_scraped_content(scraped_content)}\n\n"
         
         # Determine if this is the first thought
         is_first_thought = len(thoughts) == 0
         
         # Exec phase: Construct prompt and call LLM
-        prompt = self._construct_prompt(problem, thoughts_history, is_first_thought)
-        llm_response = call_llm(prompt)
-        
-        # Validate response
-        try:
-            self._validate_response(llm_response)
-        except ValueError as e:
-            print(f"\n[VALIDATION ERROR] {str(e)}")
-            print(f"LLM response: {json.dumps(llm_response, indent=2)[:500]}...")
-            # Try to fix common issues
-            llm_response = self._fix_llm_response(llm_response)
-            # Re-validate
-            self._validate_response(llm_response)
-        
-        # Add thought number
-        llm_response["thought_number"] = thought_number
+        system_prompt, prompt = self._construct_prompt(problem, thoughts_history, is_first_thought)
+        # The response is validated (and repaired where possible) before it
+        # is cached, so a malformed response is never served again
+        llm_response = await acall_llm(
+            prompt, system=system_prompt, stream=self.stream, validate=self._check_response
+        )
+        
+        # Keep the validated response as a typed thought
+        thought = Thought.from_dict(llm_response, thought_number)
+        
+        # Stop once the step budget is spent, even if the LLM wants to continue
+        max_steps = p.data.get("max_steps", self.max_steps)
+        if thought.next_thought_needed and thought_number >= max_steps:
+            if self.verbose:
+                print(f"\n[STEP LIMIT] Reached {max_steps} thoughts, stopping")
+            thought.next_thought_needed = False
         
         # Post phase: Process the response
-        ctx["thoughts"].append(llm_response)
+        ctx["thoughts"].append(thought)
+        formatted_plan = format_plan_for_prompt(thought.planning)
+        ctx["_thought_history"] = self._format_thought(thought, formatted_plan)
         
         # Check if we need more thoughts
-        if not llm_response["next_thought_needed"]:
+        if not thought.next_thought_needed:
             # Extract final solution
-            ctx["solution"] = self._extract_final_solution(llm_response, thoughts)
+            ctx["solution"] = self._extract_final_solution(thought, thoughts)
             
-            # Print final information
-            print("\n=== FINAL THOUGHT ===")
-            print(f"Thought #{thought_number}:")
-            print(llm_response["current_thinking"])
-            print("\n=== FINAL PLAN ===")
-            print(format_plan_for_prompt(llm_response["planning"]))
-            print("\n=== SOLUTION ===")
-            print(ctx["solution"])
+            # Print final information in one write
+            if self.verbose:
+                sys.stdout.write("".join((
+                    "\n=== FINAL THOUGHT ===\n",
+                    f"Thought #{thought_number}:\n",
+                    thought.current_thinking, "\n",
+                    "\n=== FINAL PLAN ===\n",
+                    formatted_plan, "\n",
+                    "\n=== SOLUTION ===\n",
+                    str(ctx["solution"]), "\n",
+                )))
             
             return "end", ctx["solution"]
         else:
-            # Print current thought and plan
-            print(f"\n=== THOUGHT #{thought_number} ===")
-            print(llm_response["current_thinking"])
-            print("\n=== CURRENT PLAN ===")
-            print(format_plan_for_prompt(llm_response["planning"]))
+            # Print current thought and plan in one write
+            if self.verbose:
+                sys.stdout.write("".join((
+                    f"\n=== THOUGHT #{thought_number} ===\n",
+                    thought.current_thinking, "\n",
+                    "\n=== CURRENT PLAN ===\n",
+                    formatted_plan, "\n",
+                )))
             
             return "continue", None
     
-    def _extract_final_solution(self, final_response: Dict[str, Any], all_thoughts: List[Dict[str, Any]]) -> str:
+    def _format_thought(self, thought: Thought, formatted_plan: Optional[str] = None) -> str:
+        """
+        Format a thought and its plan for the history section of the next prompt.
+        
+        Args:
+            thought: The thought to format
+            formatted_plan: The thought's plan, if already formatted
+            
+        Returns:
+            Formatted history block
+        """
+        if formatted_plan is None:
+            formatted_plan = format_plan_for_prompt(thought.planning)
+        return (
+            f"Previous thought #{thought.thought_number}:\n{thought.current_thinking}\n\n"
+            f"Current plan status:\n{formatted_plan}\n\n"
+        )
+    
+    def _extract_final_solution(self, final_thought: Thought, all_thoughts: List[Thought]) -> str:
         """
         Extract a comprehensive final solution from all thoughts.
         
         Args:
-            final_response: The final LLM response
+            final_thought: The final thought
             all_thoughts: All previous thoughts
             
         Returns:
             Comprehensive final solution
         """
         # If we have a clear final answer in the current response, use it
-        if "final_answer" in final_response:
-            return final_response["final_answer"]
+        if final_thought.final_answer is not None:
+            return final_thought.final_answer
         
         # Otherwise, synthesize from all thoughts
         solution_parts = []
         
         # Add the final thinking
-        solution_parts.append(final_response["current_thinking"])
+        solution_parts.append(final_thought.current_thinking)
         
         # Compile all results from the plan
-        if "planning" in final_response:
-            results = self._extract_plan_results(final_response["planning"])
+        if final_thought.planning:
+            results = self._extract_plan_results(final_thought.planning)
             if results:
                 solution_parts.append("\nKey Findings:")
                 solution_parts.extend(results)
@@ -156,7 +399,7 @@ class ChainOfThoughtNode(Node):
         
         return "\n".join(solution_parts)
     
-    def _extract_plan_results(self, plan: List[Dict[str, Any]]) -> List[str]:
+    def _extract_plan_results(self, plan: List[PlanStep]) -> List[str]:
         """
         Extract results from a plan.
         
@@ -167,15 +410,22 @@ class ChainOfThoughtNode(Node):
             List of result strings
         """
         results = []
-        for step in plan:
-            if step.get("status") == "Done" and "result" in step:
-                results.append(f"- {step['description']}: {step['result']}")
-            if "sub_steps" in step:
-                sub_results = self._extract_plan_results(step["sub_steps"])
-                results.extend(sub_results)
+        append = results.append
+        # Walk the plan depth-first in written order, one iterator per level
+        stack = [iter(plan)]
+        push, pop = stack.append, stack.pop
+        while stack:
+            step = next(stack[-1], None)
+            if step is None:
+                pop()
+                continue
+            if step.status == "Done" and step.result is not None:
+                append(f"- {step.description}: {step.result}")
+            if step.sub_steps:
+                push(iter(step.sub_steps))
         return results
     
-    def _extract_sources(self, thoughts: List[Dict[str, Any]]) -> List[str]:
+    def _extract_sources(self, thoughts: List[Thought]) -> List[str]:
         """
         Extract sources from all thoughts.
         
@@ -185,17 +435,12 @@ class ChainOfThoughtNode(Node):
         Returns:
             List of source strings
         """
-        sources = []
+        sources = {}
         for thought in thoughts:
             # Look for source mentions in the thinking
-            thinking = thought.get("current_thinking", "")
-            if "Source:" in thinking or "source:" in thinking:
-                # Extract source lines
-                lines = thinking.split("\n")
-                for line in lines:
-                    if "Source:" in line or "source:" in line:
-                        sources.append(line.strip())
-        return list(set(sources))  # Remove duplicates
+            for match in _SOURCE_LINE_RE.finditer(thought.current_thinking):
+                sources[match.group().strip()] = None
+        return list(sources)  # Remove duplicates, keeping first-seen order
     
     def _fix_llm_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -207,31 +452,24 @@ class ChainOfThoughtNode(Node):
         Returns:
             Fixed response
         """
-        if "planning" in response and isinstance(response["planning"], list):
-            for step in response["planning"]:
-                # Fix missing result for Done status
-                if step.get("status") == "Done" and "result" not in step:
-                    step["result"] = "Completed"  # Default result
-                
-                # Fix missing query for Search Needed status
-                if step.get("status") == "Search Needed" and "query" not in step:
-                    step["query"] = "information needed"  # Default query
-                
-                # Fix missing mark for Verification Needed status
-                if step.get("status") == "Verification Needed" and "mark" not in step:
-                    step["mark"] = "Verification required"  # Default mark
-                
-                # Fix sub-steps if present
-                if "sub_steps" in step and isinstance(step["sub_steps"], list):
-                    for sub_step in step["sub_steps"]:
-                        if sub_step.get("status") == "Done" and "result" not in sub_step:
-                            sub_step["result"] = "Completed"  # Default result
-                        if sub_step.get("status") == "Search Needed" and "query" not in sub_step:
-                            sub_step["query"] = "information needed"  # Default query
+        planning = response.get("planning")
+        if isinstance(planning, list):
+            # Fill in the field each status requires, at every level of the plan
+            stack = list(planning)
+            while stack:
+                step = stack.pop()
+                if not isinstance(step, dict):
+                    continue
+                fix = _FIX.get(step.get("status"))
+                if fix is not None and not step.get(fix[0]):
+                    step[fix[0]] = fix[1]
+                sub_steps = step.get("sub_steps")
+                if isinstance(sub_steps, list):
+                    stack.extend(sub_steps)
         
         return response
     
-    def _extract_search_queries(self, thoughts: List[Dict[str, Any]]) -> List[str]:
+    def _extract_search_queries(self, thoughts: List[Thought]) -> List[str]:
         """
         Extract search queries from the current plan.
         
@@ -244,22 +482,27 @@ class ChainOfThoughtNode(Node):
         if not thoughts:
             return []
             
-        queries = []
-        current_plan = thoughts[-1].get("planning", [])
-        
-        def extract_queries_from_plan(plan):
-            for step in plan:
-                if step.get("status") == "Search Needed" and step.get("query"):
-                    queries.append(step["query"])
-                if step.get("sub_steps"):
-                    extract_queries_from_plan(step["sub_steps"])
-        
-        extract_queries_from_plan(current_plan)
-        return queries
+        # Normalized query -> first spelling seen, so the same search asked
+        # for by several steps (or reworded only in case or spacing) runs once
+        queries: Dict[str, str] = {}
+        add = queries.setdefault
+        # Walk the current plan depth-first in written order, one iterator per level
+        stack = [iter(thoughts[-1].planning)]
+        push, pop = stack.append, stack.pop
+        while stack:
+            step = next(stack[-1], None)
+            if step is None:
+                pop()
+                continue
+            if step.status == "Search Needed" and step.query:
+                add(_normalize_query(step.query), step.query)
+            if step.sub_steps:
+                push(iter(step.sub_steps))
+        return list(queries.values())
     
     async def _perform_searches(self, queries: List[str], previous_results: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Perform searches for the given queries.
+        Perform searches for the given queries concurrently.
         
         Args:
             queries: List of search queries
@@ -268,30 +511,85 @@ class ChainOfThoughtNode(Node):
         Returns:
             Dictionary of query -> search results
         """
-        results = {}
+        sem = asyncio.Semaphore(self.max_concurrent_searches)
         
-        for query in queries:
+        async def search_one(query: str) -> List[Dict[str, Any]]:
             # Skip if we already have results for this query
             if query in previous_results:
-                results[query] = previous_results[query]
-                continue
+                return previous_results[query]
                 
             try:
-                print(f"\n[SEARCH] Performing search for: {query}")
-                response = self.search_client.search(query)
-                search_results = self.search_client.parse_web_results(response)
-                results[query] = search_results
+                async with sem:
+                    search_results = await self._search(query)
                 
                 # Print summary of search results
-                print(f"[SEARCH] Found {len(search_results)} results for: {query}")
+                lines = [f"[SEARCH] Found {len(search_results)} results for: {query}\n"]
                 for i, result in enumerate(search_results[:3], 1):  # Show first 3 results
-                    print(f"  {i}. {result['title'][:60]}...")
+                    lines.append(f"  {i}. {result['title'][:60]}...\n")
+                sys.stdout.write("".join(lines))
+                return search_results
                     
             except Exception as e:
                 print(f"[SEARCH] Error performing search for '{query}': {str(e)}")
-                results[query] = []
-                
-        return results
+                return []
+        
+        found = await asyncio.gather(*(search_one(query) for query in queries))
+        return dict(zip(queries, found))
+    
+    async def _search(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Search for a query through the shared search cache.
+        
+        Queries are keyed by their normalized words. A cached result within
+        SEARCH_CACHE_TTL is returned directly, and a query already being
+        fetched on this event loop is awaited instead of sent again.
+        
+        Args:
+            query: The search query
+            
+        Returns:
+            List of parsed web results
+        """
+        key = _normalize_query(query)
+        cached = _search_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        
+        task = _search_inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._fetch_search(query, key))
+            _search_inflight[key] = task
+            
+            def forget(done: "asyncio.Task[List[Dict[str, Any]]]") -> None:
+                # A fetch from another event loop may have replaced this one
+                # in the meantime; only remove the entry if it is still ours
+                if _search_inflight.get(key) is done:
+                    del _search_inflight[key]
+            
+            task.add_done_callback(forget)
+        # Shield the shared fetch so one cancelled caller does not cancel it for the others
+        return await asyncio.shield(task)
+    
+    async def _fetch_search(self, query: str, key: str) -> List[Dict[str, Any]]:
+        """
+        Run a search and store its results in the shared cache.
+        
+        Args:
+            query: The search query
+            key: Normalized cache key for the query
+            
+        Returns:
+            List of parsed web results
+        """
+        print(f"\n[SEARCH] Performing search for: {query}")
+        response = await self.search_client.search(query)
+        search_results = self.search_client.parse_web_results(response)
+        
+        _search_cache.pop(key, None)
+        _search_cache[key] = (time.monotonic() + SEARCH_CACHE_TTL, search_results)
+        if len(_search_cache) > SEARCH_CACHE_SIZE:
+            del _search_cache[next(iter(_search_cache))]
+        return search_results
     
     async def _scrape_search_results(self, search_results: Dict[str, Any], previous_content: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -308,22 +606,26 @@ class ChainOfThoughtNode(Node):
         
         # Collect URLs to scrape
         urls_to_scrape = []
+        # Compare canonical URLs, so tracking parameters or a trailing slash
+        # don't get the same page scraped (and prompted) twice
+        seen = {canonicalize_url(url) for url in previous_content}
         for query, results in search_results.items():
             for result in results[:self.max_scraped_urls]:  # Limit number of URLs per query
                 url = result.get('url')
-                if url and url not in previous_content and url not in urls_to_scrape:
-                    urls_to_scrape.append(url)
+                if url:
+                    key = canonicalize_url(url)
+                    if key not in seen:
+                        seen.add(key)
+                        urls_to_scrape.append(url)
         
         if not urls_to_scrape:
             return scraped_content
         
         print(f"\n[SCRAPING] Scraping content from {len(urls_to_scrape)} URLs...")
         
-        # Scrape URLs concurrently
-        scraped_data = await self.scraper.scrape_multiple_urls(urls_to_scrape)
-        
-        # Process scraped data
-        for url, data in scraped_data.items():
+        # Scrape URLs concurrently, handling each page as soon as it arrives
+        # so one slow site cannot hold the thought past the deadline
+        async for url, data in self.scraper.scrape_as_completed(urls_to_scrape, self.scrape_deadline):
             if data.get('success'):
                 scraped_content[url] = {
                     'title': data.get('title', ''),
@@ -338,32 +640,48 @@ class ChainOfThoughtNode(Node):
                     'url': url
                 }
                 print(f"[SCRAPING] Failed to scrape: {url[:60]}... ({data.get('error', 'Unknown error')})")
+            
+            # Truncate and render once here so every prompt that shows this page reuses it
+            page = scraped_content[url]
+            content = page['content']
+            page['preview'] = content[:500] + ('...' if len(content) > 500 else '')
+            page['_formatted'] = self._format_scraped_page(url, page)
         
         return scraped_content
     
-    def _format_search_results(self, search_results: Dict[str, Any]) -> str:
+    def _format_search_results(self, search_results: Dict[str, Any], blocks: Optional[Dict[str, str]] = None) -> str:
         """
         Format search results for inclusion in the prompt.
         
+        A plan often keeps the same query across several thoughts, so the
+        block rendered for each query can be kept in `blocks` and reused.
+        
         Args:
             search_results: Dictionary of query -> results
+            blocks: Optional cache of query -> rendered block, updated in place
             
         Returns:
             Formatted string of search results
         """
         if not search_results:
             return "No recent search results."
+        if blocks is None:
+            blocks = {}
             
         formatted = []
         for query, results in search_results.items():
-            formatted.append(f"Results for '{query}':")
-            for i, result in enumerate(results[:3], 1):  # Show first 3 results
-                formatted.append(f"  {i}. {result['title']}")
-                formatted.append(f"     {result['description'][:100]}...")
-                formatted.append(f"     URL: {result['url']}")
-            if len(results) > 3:
-                formatted.append(f"  ... and {len(results) - 3} more results")
-            formatted.append("")  # Empty line between queries
+            block = blocks.get(query)
+            if block is None:
+                lines = [f"Results for '{query}':"]
+                for i, result in enumerate(results[:3], 1):  # Show first 3 results
+                    lines.append(f"  {i}. {result['title']}")
+                    lines.append(f"     {result['description'][:100]}...")
+                    lines.append(f"     URL: {result['url']}")
+                if len(results) > 3:
+                    lines.append(f"  ... and {len(results) - 3} more results")
+                lines.append("")  # Empty line between queries
+                block = blocks[query] = "\n".join(lines)
+            formatted.append(block)
             
         return "\n".join(formatted)
     
@@ -380,136 +698,82 @@ class ChainOfThoughtNode(Node):
         if not scraped_content:
             return "No scraped content."
             
-        formatted = []
-        for url, content_data in list(scraped_content.items())[:5]:  # Limit to top 5
-            title = content_data.get('title', 'No title')
-            content = content_data.get('content', '')[:500] + ('...' if len(content_data.get('content', '')) > 500 else '')
-            formatted.append(f"From '{title}':")
-            formatted.append(f"  {content}")
-            formatted.append(f"  Source: {url}")
-            formatted.append("")  # Empty line between sources
+        formatted = [
+            content_data.get('_formatted') or self._format_scraped_page(url, content_data)
+            for url, content_data in islice(scraped_content.items(), 5)  # Limit to top 5
+        ]
             
         if len(scraped_content) > 5:
             formatted.append(f"... and {len(scraped_content) - 5} more sources")
             
         return "\n".join(formatted)
     
-    def _construct_prompt(self, problem: str, thoughts_history: str, is_first_thought: bool) -> str:
+    def _format_scraped_page(self, url: str, content_data: Dict[str, Any]) -> str:
+        """
+        Render one scraped page as a block of the scraped-content section.
+        
+        Args:
+            url: The page URL
+            content_data: The page's scraped content
+            
+        Returns:
+            Formatted block, ending with a blank line
+        """
+        title = content_data.get('title', 'No title')
+        content = content_data.get('preview')
+        if content is None:
+            content = content_data.get('content', '')
+            content = content[:500] + ('...' if len(content) > 500 else '')
+        return f"From '{title}':\n  {content}\n  Source: {url}\n"
+    
+    def _construct_prompt(self, problem: str, thoughts_history: str, is_first_thought: bool) -> Tuple[str, str]:
         """
         Construct the prompt for the LLM based on the current state.
         
+        The prompt is split into a system prompt that never changes between
+        calls and a user prompt holding the problem and history. Keeping the
+        static text first lets the provider reuse its cached prefix.
+        
         Args:
             problem: The problem statement
             thoughts_history: Formatted history of previous thoughts
             is_first_thought: Whether this is the first thought
             
         Returns:
-            The complete prompt to send to the LLM
+            Tuple of (system_prompt, user_prompt) to send to the LLM
         """
-        prompt = f"""You are an expert problem solver using a Chain of Thought approach. 
-You break down complex problems into clear, logical steps and solve them systematically.
-You are thorough, accurate, and verify your work when possible.
-You can search the web for information and use scraped content to inform your answers.
-
-PROBLEM:
-{problem}
-
-"""
-
         if is_first_thought:
-            prompt += """This is the first step in solving this problem. Please:
-1. Analyze the problem carefully, identifying key components and requirements
-2. Create a comprehensive initial plan with clear, actionable steps
-3. Begin executing the first step of your plan with detailed reasoning
-4. Update the plan status accordingly with specific results
-5. If you need to search for information, mark the step as "Search Needed" with a specific query
-
-"""
-        else:
-            prompt += f"""PREVIOUS THOUGHTS AND PLAN:
-{thoughts_history}
-Based on the previous thought, plan status, search results, and scraped content, please:
-1. Critically evaluate the previous step's reasoning and results for accuracy
-2. Identify any errors, gaps, or issues that need to be addressed
-3. Use the scraped content to inform your answers when relevant
-4. Execute the next pending step in the plan with detailed reasoning
-5. If needed, refine the plan by breaking down complex steps into more granular sub-steps
-6. Update the status of plan steps and record specific, concise results
-7. If you need to search for information, mark steps as "Search Needed" with a specific query
-8. If verification is needed, mark steps as "Verification Needed" with a clear reason
-9. When you have completed all steps and have a comprehensive answer, set next_thought_needed to false and provide a final_answer field with your complete response
-
-"""
-
-        prompt += """Please provide your response in JSON format with the following structure (strictly follow this schema):
-
-```
-{
-  "current_thinking": "[Your detailed evaluation and thinking for this step - be comprehensive and logical. Reference scraped content when relevant.]",
-  "planning": [
-    {
-      "description": "[Step description - specific and actionable]",
-      "status": "[Pending|Done|Verification Needed|Search Needed]",
-      "result": "[REQUIRED IF STATUS IS DONE: Concise result when status is Done]",
-      "query": "[REQUIRED IF STATUS IS SEARCH NEEDED: Specific search query when status is Search Needed]",
-      "mark": "[REQUIRED IF STATUS IS VERIFICATION NEEDED: Reason for Verification Needed]",
-      "sub_steps": [
-        {
-          "description": "[Sub-step description - specific and actionable]",
-          "status": "[Pending|Done|Search Needed]",
-          "result": "[REQUIRED IF STATUS IS DONE: Concise result when status is Done]",
-          "query": "[REQUIRED IF STATUS IS SEARCH NEEDED: Specific search query when status is Search Needed]"
-        }
-        // ... more sub-steps if needed
-      ]
-    }
-    // ... more steps if needed
-  ],
-  "next_thought_needed": true,
-  "final_answer": "[REQUIRED ONLY WHEN next_thought_needed IS false: Your complete, comprehensive final answer to the original problem]"
-}
-```
-
-IMPORTANT REQUIREMENTS:
-- Status meanings:
-  * "Pending": For steps not yet started
-  * "Done": For completed steps (MUST include "result" field)
-  * "Verification Needed": For steps that need verification (MUST include "mark" field)
-  * "Search Needed": For steps requiring external information (MUST include "query" field)
-- All "Done" steps MUST have a "result" field with a concise result description
-- All "Search Needed" steps MUST have a "query" field with a specific search query
-- All "Verification Needed" steps MUST have a "mark" field with a clear reason
-- When you have completed your analysis and have a comprehensive answer to the original problem:
-  * Set next_thought_needed to false
-  * Provide a "final_answer" field containing your complete, well-structured response to the original problem
-  * The final_answer should synthesize all your findings into a coherent, comprehensive response
-- Ensure all JSON is properly formatted and all fields are correctly filled out
-- When using scraped content, reference the source URL in your thinking
-
-Example of correct "Done" step:
-{
-  "description": "Research Keynesian fiscal policy",
-  "status": "Done",
-  "result": "Keynes advocated for government spending during recessions to stimulate demand"
-}
-
-Example of correct "Search Needed" step:
-{
-  "description": "Research modern applications of Keynesian theory",
-  "status": "Search Needed",
-  "query": "modern applications of Keynesian economic theory 2020s"
-}
-
-Example of final response:
-{
-  "current_thinking": "All steps have been completed and I have a comprehensive understanding...",
-  "planning": [...],
-  "next_thought_needed": false,
-  "final_answer": "This is my complete, comprehensive answer to the original problem..."
-}
-"""
-        return prompt
+            return _SYSTEM_PROMPT, "".join(("PROBLEM:\n", problem, "\n\n", _FIRST_THOUGHT_PROMPT))
+        return _SYSTEM_PROMPT, "".join((
+            "PROBLEM:\n", problem, "\n\n",
+            _CONTINUE_HEADER, thoughts_history, _CONTINUE_PROMPT,
+        ))
 
+    def _check_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate an LLM response, fixing common issues if it is invalid.
+        
+        Args:
+            response: The parsed LLM response
+            
+        Returns:
+            The valid (possibly fixed) response
+            
+        Raises:
+            ValueError: If the response is still invalid after fixing
+        """
+        try:
+            self._validate_response(response)
+        except ValueError as e:
+            print(f"\n[VALIDATION ERROR] {str(e)}")
+            dump = orjson.dumps(response, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            print(f"LLM response: {dump[:500].decode(errors='ignore')}...")
+            # Try to fix common issues
+            response = self._fix_llm_response(response)
+            # Re-validate
+            self._validate_response(response)
+        return response
+    
     def _validate_response(self, response: Dict[str, Any]) -> None:
         """
         Validate the LLM response has the required structure.
@@ -520,11 +784,11 @@ Example of final response:
         Raises:
             ValueError: If the response is missing required fields or has invalid types
         """
-        required_fields = ["current_thinking", "planning", "next_thought_needed"]
-        
-        for field in required_fields:
-            if field not in response:
-                raise ValueError(f"LLM response missing required field: {field}")
+        # One subset test in the common case; find which field is missing
+        # only when one is
+        if not _REQUIRED_FIELD_SET <= response.keys():
+            field = next(field for field in _REQUIRED_FIELDS if field not in response)
+            raise ValueError(f"LLM response missing required field: {field}")
         
         if not isinstance(response["current_thinking"], str):
             raise ValueError("current_thinking must be a string")
@@ -539,50 +803,68 @@ Example of final response:
         if not response["next_thought_needed"] and "final_answer" not in response:
             raise ValueError("Final response must include a 'final_answer' field")
         
+        # A final answer cut off mid-response would be reported as complete
+        if not response["next_thought_needed"] and response.get(TRUNCATED_KEY):
+            raise ValueError("Final response was truncated; its final_answer may be incomplete")
+        
         # Validate plan structure
         for step in response["planning"]:
             self._validate_plan_step(step)
 
     def _validate_plan_step(self, step: Dict[str, Any]) -> None:
         """
-        Validate a plan step has the required structure.
+        Validate a plan step and all of its sub-steps.
+        
+        Steps are checked depth-first with an explicit stack, in the same
+        order as the plan is written.
         
         Args:
             step: The plan step to validate
             
         Raises:
-            ValueError: If the step is missing required fields or has invalid types
+            ValueError: If a step is missing required fields or has invalid types
         """
-        if "description" not in step:
-            raise ValueError("Plan step missing description field")
-        
-        if "status" not in step:
-            raise ValueError("Plan step missing status field")
-        
-        valid_statuses = ["Pending", "Done", "Verification Needed", "Search Needed"]
-        if step["status"] not in valid_statuses:
-            raise ValueError(f"Invalid status: {step['status']}. Must be one of {valid_statuses}")
-        
-        # For "Done" status, result is required
-        if step["status"] == "Done" and ("result" not in step or not step["result"]):
-            raise ValueError("Plan step with 'Done' status must have a non-empty result field")
-        
-        # For "Search Needed" status, query is required
-        if step["status"] == "Search Needed" and ("query" not in step or not step["query"]):
-            raise ValueError("Plan step with 'Search Needed' status must have a non-empty query field")
-        
-        # For "Verification Needed" status, mark is required
-        if step["status"] == "Verification Needed" and ("mark" not in step or not step["mark"]):
-            raise ValueError("Plan step with 'Verification Needed' status must have a non-empty mark field")
-        
-        # Validate sub-steps if present
-        if "sub_steps" in step and step["sub_steps"]:
-            if not isinstance(step["sub_steps"], list):
-                raise ValueError("sub_steps must be a list")
+        stack = [step]
+        while stack:
+            step = stack.pop()
+            if "description" not in step:
+                raise ValueError("Plan step missing description field")
+            
+            if "status" not in step:
+                raise ValueError("Plan step missing status field")
             
-            for sub_step in step["sub_steps"]:
-                self._validate_plan_step(sub_step)
+            status = step["status"]
+            if status not in _VALID_STATUSES:
+                raise ValueError(f"Invalid status: {status}. Must be one of {list(_STATUS_ORDER)}")
+            
+            # Done, Search Needed and Verification Needed each require a field
+            fix = _FIX.get(status)
+            if fix is not None and not step.get(fix[0]):
+                raise ValueError(f"Plan step with '{status}' status must have a non-empty {fix[0]} field")
+            
+            # Validate sub-steps if present
+            sub_steps = step.get("sub_steps")
+            if sub_steps:
+                if not isinstance(sub_steps, list):
+                    raise ValueError("sub_steps must be a list")
+                stack.extend(reversed(sub_steps))
+    
+    async def __aenter__(self):
+        return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Clean up resources."""
-        await self.scraper.close()
\ No newline at end of file
+        clients, self._shared = self._shared, None
+        if clients is not None:
+            clients.users -= 1
+            if clients.users == 0:
+                loop = asyncio.get_running_loop()
+                if _shared_clients.get(loop) is clients:
+                    del _shared_clients[loop]
+                await clients.scraper.close()
+                await clients.search_client.aclose()
+        else:
+            if self._owns_scraper:
+                await self.scraper.close()
+            if self._owns_search_client:
+                await self.search_client.aclose()
\ No newline at end of file
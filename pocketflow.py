@@ -1,8 +1,13 @@
 from __future__ import annotations
 import asyncio
-from typing import Any, Mapping, Sequence, TypedDict
+import random
+from contextlib import nullcontext
+from collections import ChainMap
+from typing import Any, AsyncIterator, Callable, Coroutine, Mapping, Sequence, TypedDict, TypeVar
 from dataclasses import dataclass
 
+T = TypeVar("T")
+
 # ---------- Public API ----------
 class Context(TypedDict, total=False):
     """Shared immutable context visible to every node."""
@@ -46,20 +51,28 @@ class Flow:
         Run the graph once.
         If semaphore is given, at most that many nodes execute concurrently.
         """
-        sem = semaphore or asyncio.Semaphore(1_000_000)
+        # nullcontext() also supports async with, at no cost per node
+        sem = semaphore or nullcontext()
         params = params or Params({})
 
-        async def _visit(node: Node) -> Any:
+        # Follow edges in a loop, holding the semaphore for one node at a
+        # time: recursing would keep every ancestor's slot while its
+        # successors waited for one.
+        node: Node | None = self._start
+        while True:
             async with sem:
                 action, value = await node(ctx, params)
-                next_node = self._edges.get(action)
-                return (await _visit(next_node)) if next_node else value
-
-        return await _visit(self._start)
+            node = self._edges.get(action)
+            if node is None:
+                return value
 
 
 class BatchFlow:
-    """Run the same graph with different parameters, concurrently."""
+    """
+    Run the same graph with different parameters, concurrently.
+    Each run gets its own ChainMap layer over ctx: keys it writes stay
+    private to that run, while keys already in ctx are visible to all.
+    """
     def __init__(self, start: Node) -> None:
         self._flow = Flow(start)
 
@@ -71,23 +84,63 @@ class BatchFlow:
         max_parallel: int | None = None,
     ) -> list[Any]:
         semaphore = asyncio.Semaphore(max_parallel) if max_parallel else None
-        coros = [self._flow.run(ctx, p, semaphore=semaphore) for p in params_list]
+        coros = [self._flow.run(ChainMap({}, ctx), p, semaphore=semaphore) for p in params_list]
         return await asyncio.gather(*coros)
 
+    async def as_completed(
+        self,
+        ctx: Context,
+        params_list: Sequence[Params],
+        *,
+        max_parallel: int | None = None,
+        timeout: float | None = None,
+    ) -> AsyncIterator[tuple[int, Any]]:
+        """
+        Like run(), but yield (index, value) pairs as each run finishes,
+        so slow runs don't hold back finished ones.
+        If timeout is given, a run exceeding it yields its TimeoutError as value.
+        """
+        semaphore = asyncio.Semaphore(max_parallel) if max_parallel else None
+
+        async def _one(index: int, p: Params) -> tuple[int, Any]:
+            try:
+                coro = self._flow.run(ChainMap({}, ctx), p, semaphore=semaphore)
+                return index, await asyncio.wait_for(coro, timeout)
+            except asyncio.TimeoutError as exc:
+                return index, exc
+
+        tasks = [asyncio.ensure_future(_one(i, p)) for i, p in enumerate(params_list)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            # Wait for cancelled runs to unwind, so their cleanup finishes
+            # before the consumer moves on
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
 
 # ---------- Retry wrapper ----------
 class Retry(Node):
+    """
+    Retry inner up to tries times, sleeping between attempts.
+    The delay starts at backoff and doubles up to cap; with jitter,
+    each sleep is drawn uniformly from [delay / 2, delay].
+    """
     def __init__(
         self,
         inner: Node,
         *,
         tries: int = 3,
         backoff: float = 0.1,
+        cap: float = 10.0,
         jitter: bool = True,
     ) -> None:
         self._inner = inner
         self.tries = max(tries, 1)
         self.backoff = backoff
+        self.cap = cap
         self.jitter = jitter
 
     async def __call__(self, ctx: Context, p: Params) -> tuple[str, Any]:
@@ -98,6 +151,24 @@ class Retry(Node):
             except Exception as exc:
                 if attempt == self.tries - 1:
                     raise
-                await asyncio.sleep(delay)
-                if self.jitter:
-                    delay *= 1.5 * (0.5 + 0.5 * hash((id(self), attempt)) % 1)
\ No newline at end of file
+                await asyncio.sleep(random.uniform(0.5 * delay, delay) if self.jitter else delay)
+                delay = min(self.cap, delay * 2)
+
+
+# ---------- Entry point ----------
+def _loop_factory() -> Callable[[], asyncio.AbstractEventLoop] | None:
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
+
+def run(main: Coroutine[Any, Any, T]) -> T:
+    """
+    Like asyncio.run(), but on uvloop when it is installed.
+    Its libuv loop is markedly faster on the many concurrent sockets
+    that search and scraping fan out to.
+    """
+    with asyncio.Runner(loop_factory=_loop_factory()) as runner:
+        return runner.run(main)
@@ -1,16 +1,216 @@
+from __future__ import annotations
+import os
 import re
 import time
-from typing import Dict, Any, List, Optional, Tuple
+import sqlite3
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple, AsyncIterator, Iterator, NamedTuple
 import httpx
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+import orjson
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
 import asyncio
-from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, lru_cache
+
+# lxml is imported on first parse: validating, canonicalizing and failing
+# URLs never need it
+if TYPE_CHECKING:
+    from lxml import etree, html
+
+# Optional SQLite file to keep scraped pages in across runs (off by default)
+SCRAPER_CACHE_PATH = os.environ.get("SCRAPER_CACHE_PATH")
+# Seconds a cached page is served without asking the server again
+SCRAPER_CACHE_TTL = float(os.environ.get("SCRAPER_CACHE_TTL", "3600"))
+# Maximum number of pages kept in the cache
+SCRAPER_CACHE_SIZE = int(os.environ.get("SCRAPER_CACHE_SIZE", "1024"))
+# Seconds a URL that returned 404 or 410 is not requested again
+SCRAPER_NEGATIVE_TTL = float(os.environ.get("SCRAPER_NEGATIVE_TTL", "3600"))
+# Maximum bytes of a page body downloaded; only the first 5000 characters
+# of text are kept, so the rest of a huge page is never needed
+SCRAPER_MAX_BYTES = int(os.environ.get("SCRAPER_MAX_BYTES", str(512 * 1024)))
+
+# Worker processes for parsing pages (0 parses on the event loop thread)
+SCRAPER_PARSE_WORKERS = int(os.environ.get("SCRAPER_PARSE_WORKERS", "0"))
+
+# Check each site's robots.txt before scraping it (off by default)
+SCRAPER_RESPECT_ROBOTS = os.environ.get("SCRAPER_RESPECT_ROBOTS") == "1"
+
+# httpx decodes brotli responses only when the brotli package is installed
+try:
+    import brotli  # noqa: F401
+    _ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    _ACCEPT_ENCODING = 'gzip, deflate'
+
+# Statuses worth retrying after a backoff: rate limited or overloaded
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# An http(s) URL with a host: all _is_valid_url needs, without urlparse
+_URL_RE = re.compile(r"^https?://[^/\s?#]+", re.IGNORECASE)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Characters of page text whitespace-collapsed up front; enough to yield the
+# 5000 kept characters on all but the most whitespace-heavy pages
+_CLEAN_PREFIX = 20000
+
+# Query parameters that only track where a click came from
+_TRACKING_PARAMS = frozenset({'fbclid', 'gclid', 'ref', 'mc_cid', 'mc_eid'})
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+@lru_cache(maxsize=4096)
+def canonicalize_url(url: str) -> str:
+    """
+    Reduce a URL to a canonical form for spotting duplicate pages.
+    
+    Lowercases the scheme and host, drops the scheme's default port, the
+    fragment and tracking query parameters, and removes any trailing slash
+    from the path.
+    
+    Args:
+        url: The URL to canonicalize
+        
+    Returns:
+        The canonical URL
+    """
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc.lower()
+        if parts.port is not None and parts.port == _DEFAULT_PORTS.get(scheme):
+            netloc = netloc.rsplit(':', 1)[0]
+    except ValueError:
+        return url
+    query = urlencode([
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.startswith('utm_') and name not in _TRACKING_PARAMS
+    ])
+    return urlunsplit((scheme, netloc, parts.path.rstrip('/'), query, ''))
+
+@lru_cache(maxsize=16)
+def _html_parser(encoding: Optional[str]) -> html.HTMLParser:
+    """Return an lxml HTML parser for a declared charset, ignoring unknown ones."""
+    from lxml import html
+    try:
+        return html.HTMLParser(encoding=encoding)
+    except LookupError:
+        return html.HTMLParser()
+
+@lru_cache(maxsize=None)
+def _content_attr_xpath() -> etree.XPath:
+    """
+    Return the XPath matching main content candidates by attribute.
+    
+    Covers role="main", id "content" and every class containing "content";
+    the exact class tokens are checked on its (few) matches. Compiled once.
+    """
+    from lxml import etree
+    return etree.XPath('//*[@role="main" or @id="content" or contains(@class, "content")]')
+
+class CachedPage(NamedTuple):
+    """A scraped page stored in the page cache, with its HTTP validators."""
+    page: Dict[str, Any]
+    fetched: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+class PageCache:
+    """
+    On-disk LRU cache of scraped pages keyed by URL.
+    
+    Pages are stored in SQLite along with their ETag and Last-Modified
+    headers, so a stale entry can be revalidated with a conditional request
+    instead of downloaded and parsed again.
+    """
+    
+    def __init__(self, path: str, maxsize: int = 1024):
+        """
+        Initialize the page cache.
+        
+        Args:
+            path: SQLite file to store pages in
+            maxsize: Maximum number of pages kept
+        """
+        self.maxsize = maxsize
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, page BLOB, fetched REAL, used REAL, etag TEXT, last_modified TEXT)"
+        )
+        self._db.commit()
+    
+    def get(self, url: str) -> Optional[CachedPage]:
+        """
+        Look up a cached page.
+        
+        Args:
+            url: The page URL
+            
+        Returns:
+            The cached page, or None on a miss
+        """
+        row = self._db.execute(
+            "SELECT page, fetched, etag, last_modified FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE pages SET used = ? WHERE url = ?", (time.time(), url))
+        self._db.commit()
+        return CachedPage(orjson.loads(row[0]), row[1], row[2], row[3])
+    
+    def put(self, url: str, page: Dict[str, Any], etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """
+        Store a scraped page, evicting the least recently used ones if full.
+        
+        Args:
+            url: The page URL
+            page: The scraped content
+            etag: The response's ETag header, if any
+            last_modified: The response's Last-Modified header, if any
+        """
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO pages (url, page, fetched, used, etag, last_modified) VALUES (?, ?, ?, ?, ?, ?)",
+            (url, orjson.dumps(page), now, now, etag, last_modified),
+        )
+        self._db.execute(
+            "DELETE FROM pages WHERE url NOT IN (SELECT url FROM pages ORDER BY used DESC LIMIT ?)",
+            (self.maxsize,),
+        )
+        self._db.commit()
+    
+    def touch(self, url: str) -> None:
+        """Mark a cached page as freshly fetched, after the server confirmed it is unchanged."""
+        now = time.time()
+        self._db.execute("UPDATE pages SET fetched = ?, used = ? WHERE url = ?", (now, now, url))
+        self._db.commit()
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
 
 class WebScraper:
     """A robust web scraper with error handling and content extraction."""
     
-    def __init__(self, timeout: int = 10, max_retries: int = 3, delay: float = 1.0):
+    # Main content candidates matched by attribute, in priority order:
+    # role="main", class "content", class "main-content", id "content",
+    # class "post-content", class "entry-content". One XPath finds them all
+    # in a single pass over the tree (see _content_attr_xpath).
+    _CONTENT_CLASS_SLOTS = {'content': 1, 'main-content': 2, 'post-content': 4, 'entry-content': 5}
+    
+    def __init__(
+        self,
+        timeout: int = 10,
+        max_retries: int = 3,
+        delay: float = 1.0,
+        cache_path: Optional[str] = SCRAPER_CACHE_PATH,
+        cache_ttl: float = SCRAPER_CACHE_TTL,
+        negative_ttl: float = SCRAPER_NEGATIVE_TTL,
+        max_concurrency: int = 16,
+        parse_workers: int = SCRAPER_PARSE_WORKERS,
+        respect_robots: bool = SCRAPER_RESPECT_ROBOTS,
+    ):
         """
         Initialize the web scraper.
         
@@ -18,21 +218,44 @@ class WebScraper:
             timeout: Request timeout in seconds
             max_retries: Maximum number of retry attempts
             delay: Delay between retries in seconds
+            cache_path: Optional SQLite file to cache scraped pages in
+            cache_ttl: Seconds a cached page is used without revalidating it
+            negative_ttl: Seconds a URL that returned 404 or 410 is skipped
+            max_concurrency: Maximum number of requests in flight at once
+            parse_workers: Number of processes to parse pages in; 0 parses
+                them on the event loop thread, which is cheaper for a few
+                pages at a time
+            respect_robots: Skip URLs that the site's robots.txt disallows
         """
         self.timeout = timeout
         self.max_retries = max_retries
         self.delay = delay
-        self.client = httpx.AsyncClient(
+        self.cache = PageCache(cache_path, SCRAPER_CACHE_SIZE) if cache_path else None
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        # URL -> time until which it is known to be gone
+        self._dead: Dict[str, float] = {}
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.respect_robots = respect_robots
+        # Site origin -> task fetching its robots.txt rules
+        self._robots: Dict[str, asyncio.Future] = {}
+        self._pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 0 else None
+        # HTTP/2 multiplexes the requests to one origin over a single
+        # connection; httpx manages keep-alive itself within these limits
+        self._limits = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=30.0)
+        self._client_kwargs = dict(
             timeout=timeout,
             headers={
                 'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:141.0) Gecko/20100101 Firefox/141.0',
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
                 'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
+                'Accept-Encoding': _ACCEPT_ENCODING,
                 'Upgrade-Insecure-Requests': '1',
-            }
+            },
         )
+        self.client = httpx.AsyncClient(transport=self._transport(http2=True), **self._client_kwargs)
+        # HTTP/1.1 client for servers with broken HTTP/2, created on first use
+        self._http1_client: Optional[httpx.AsyncClient] = None
     
     async def scrape_url(self, url: str) -> Dict[str, Any]:
         """
@@ -46,73 +269,224 @@ class WebScraper:
         """
         # Validate URL
         if not self._is_valid_url(url):
-            return {
-                'url': url,
-                'success': False,
-                'error': 'Invalid URL format',
-                'title': '',
-                'content': '',
-                'links': []
-            }
+            return self._error_result(url, 'Invalid URL format')
+        
+        # Cache and skip lists are keyed by canonical URL, so spellings that
+        # differ only in tracking parameters or a trailing slash share entries
+        key = canonicalize_url(url)
+        
+        # Skip URLs that recently returned 404 or 410
+        dead_until = self._dead.get(key)
+        if dead_until is not None:
+            if dead_until > time.monotonic():
+                return self._error_result(url, 'Page not found (cached)')
+            del self._dead[key]
+        
+        # Serve fresh pages from the cache, and revalidate stale ones
+        cached = self.cache.get(key) if self.cache is not None else None
+        headers = {}
+        if cached is not None:
+            if time.time() - cached.fetched < self.cache_ttl:
+                return cached.page
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+        
+        # Stay off paths the site's robots.txt disallows
+        if self.respect_robots and not await self._robots_allowed(url):
+            return self._error_result(url, 'Disallowed by robots.txt')
+        
+        # Bound the requests in flight, so large batches neither exhaust
+        # sockets nor buffer too many response bodies at once
+        async with self._sem:
+            return await self._fetch(url, key, cached, headers)
+    
+    async def _robots_allowed(self, url: str) -> bool:
+        """
+        Check a URL against its site's robots.txt.
+        
+        Each site's robots.txt is fetched once per scraper, however many of
+        its URLs are scraped concurrently.
+        
+        Args:
+            url: The URL to check
+            
+        Returns:
+            False if robots.txt disallows the URL, True otherwise
+        """
+        parts = urlsplit(url)
+        origin = f'{parts.scheme}://{parts.netloc}'.lower()
+        task = self._robots.get(origin)
+        if task is None:
+            task = self._robots[origin] = asyncio.ensure_future(self._fetch_robots(origin))
+        # Shield the shared fetch so one cancelled caller does not cancel it for the others
+        parser = await asyncio.shield(task)
+        return parser is None or parser.can_fetch(self._client_kwargs['headers']['User-Agent'], url)
+    
+    async def _fetch_robots(self, origin: str) -> Optional[RobotFileParser]:
+        """
+        Fetch and parse a site's robots.txt.
         
-        # Try to fetch the page with retries
+        Args:
+            origin: Scheme and host of the site
+            
+        Returns:
+            The parsed rules, or None if the site has none (or they could
+            not be fetched), which allows everything
+        """
+        try:
+            response = await self.client.get(origin + '/robots.txt')
+        except httpx.HTTPError:
+            return None
+        parser = RobotFileParser()
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif not response.is_success:
+            return None
+        else:
+            parser.parse(response.text.splitlines())
+        return parser
+    
+    async def _fetch(self, url: str, key: str, cached: Optional[CachedPage], headers: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Fetch and parse a URL with retries.
+        
+        Args:
+            url: The URL to scrape
+            key: Canonical URL the page is cached under
+            cached: The stale cache entry being revalidated, if any
+            headers: Conditional request headers for the cached entry
+            
+        Returns:
+            Dictionary containing scraped content and metadata
+        """
+        # Connection failures (refused or timed out) are retried by the
+        # transport; read and pool timeouts and overloaded servers are
+        # retried here, with exponential backoff
+        error = 'Max retries exceeded'
         for attempt in range(self.max_retries):
+            if attempt:
+                await asyncio.sleep(self.delay * (2 ** (attempt - 1)))
             try:
-                response = await self.client.get(url)
+                response, body = await self._get(url, headers)
+                if response.status_code == 304 and cached is not None:
+                    self.cache.touch(key)
+                    return cached.page
+                if response.status_code in (404, 410):
+                    self._dead[key] = time.monotonic() + self.negative_ttl
+                if response.status_code in _RETRY_STATUSES:
+                    error = f'HTTP {response.status_code} {response.reason_phrase}'
+                    continue
                 response.raise_for_status()
                 
+                # lxml rejects an empty document; it is a failed scrape,
+                # not a page to cache
+                if not body or body.isspace():
+                    return self._error_result(url, 'Empty document')
+                
                 # Parse the content
-                content = await self._parse_content(response, url)
+                content = await self._parse_content(response, body, url)
                 content['success'] = True
                 content['error'] = None
+                if self.cache is not None:
+                    self.cache.put(key, content, response.headers.get('etag'), response.headers.get('last-modified'))
                 return content
                 
+            except httpx.ConnectTimeout:
+                error = 'Timeout error'
+                break  # the transport has already retried connecting
+                
             except httpx.TimeoutException:
-                if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.delay * (2 ** attempt))  # Exponential backoff
-                    continue
-                return {
-                    'url': url,
-                    'success': False,
-                    'error': 'Timeout error',
-                    'title': '',
-                    'content': '',
-                    'links': []
-                }
+                error = 'Timeout error'
                 
-            except httpx.RequestError as e:
-                if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.delay * (2 ** attempt))  # Exponential backoff
-                    continue
-                return {
-                    'url': url,
-                    'success': False,
-                    'error': f'Request error: {str(e)}',
-                    'title': '',
-                    'content': '',
-                    'links': []
-                }
+            except httpx.TransportError as e:
+                error = f'Request error: {str(e)}'
+                if isinstance(e, httpx.ConnectError):
+                    break  # the transport has already retried connecting
                 
             except Exception as e:
-                return {
-                    'url': url,
-                    'success': False,
-                    'error': f'Unexpected error: {str(e)}',
-                    'title': '',
-                    'content': '',
-                    'links': []
-                }
+                error = f'Unexpected error: {str(e)}'
+                break
+        
+        return self._error_result(url, error)
+    
+    def _transport(self, http2: bool) -> httpx.AsyncHTTPTransport:
+        """
+        Create a connection pool for one of the HTTP clients.
+        
+        Args:
+            http2: Whether to negotiate HTTP/2
+            
+        Returns:
+            A transport that retries failed connection attempts
+        """
+        return httpx.AsyncHTTPTransport(http2=http2, limits=self._limits, retries=self.max_retries)
+    
+    @staticmethod
+    def _error_result(url: str, error: str) -> Dict[str, Any]:
+        """
+        Build the result for a URL that could not be scraped.
         
-        # If we get here, all retries failed
+        Args:
+            url: The URL
+            error: Description of what went wrong
+            
+        Returns:
+            Dictionary with the error and empty content
+        """
         return {
             'url': url,
             'success': False,
-            'error': 'Max retries exceeded',
+            'error': error,
             'title': '',
             'content': '',
             'links': []
         }
     
+    async def _get(self, url: str, headers: Dict[str, str]) -> Tuple[httpx.Response, bytes]:
+        """
+        GET a URL, retrying once over HTTP/1.1 if the HTTP/2 exchange fails.
+        
+        Args:
+            url: The URL to fetch
+            headers: Extra request headers
+            
+        Returns:
+            The HTTP response and its (possibly truncated) body
+        """
+        try:
+            return await self._read(self.client, url, headers)
+        except httpx.ProtocolError:
+            if self._http1_client is None:
+                self._http1_client = httpx.AsyncClient(transport=self._transport(http2=False), **self._client_kwargs)
+            return await self._read(self._http1_client, url, headers)
+    
+    async def _read(self, client: httpx.AsyncClient, url: str, headers: Dict[str, str]) -> Tuple[httpx.Response, bytes]:
+        """
+        Stream a response body, stopping after SCRAPER_MAX_BYTES.
+        
+        Only successful HTML responses are read; for anything else the
+        body is not needed and is left unread.
+        
+        Args:
+            client: The HTTP client to use
+            url: The URL to fetch
+            headers: Extra request headers
+            
+        Returns:
+            The HTTP response and its body
+        """
+        body = bytearray()
+        async with client.stream('GET', url, headers=headers) as response:
+            if response.is_success and 'text/html' in response.headers.get('content-type', '').lower():
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) >= SCRAPER_MAX_BYTES:
+                        del body[SCRAPER_MAX_BYTES:]
+                        break
+        return response, bytes(body)
+    
     async def scrape_multiple_urls(self, urls: List[str]) -> Dict[str, Dict[str, Any]]:
         """
         Scrape multiple URLs concurrently.
@@ -123,37 +497,95 @@ class WebScraper:
         Returns:
             Dictionary mapping URLs to their scraped content
         """
-        # Remove duplicates while preserving order
-        unique_urls = list(dict.fromkeys(urls))
+        # Scrape each page once, however many spellings of its URL were given
+        groups = self._group_by_canonical(urls)
+        unique_urls = [group[0] for group in groups]
         
         # Scrape all URLs concurrently
         tasks = [self.scrape_url(url) for url in unique_urls]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Process results
+        # Process results, keyed by every original URL
         scraped_data = {}
-        for i, result in enumerate(results):
-            url = unique_urls[i]
+        for group, result in zip(groups, results):
+            url = group[0]
             if isinstance(result, Exception):
-                scraped_data[url] = {
-                    'url': url,
-                    'success': False,
-                    'error': f'Exception during scraping: {str(result)}',
-                    'title': '',
-                    'content': '',
-                    'links': []
-                }
-            else:
-                scraped_data[url] = result
+                result = self._error_result(url, f'Exception during scraping: {str(result)}')
+            for original in group:
+                scraped_data[original] = result
                 
         return scraped_data
     
-    async def _parse_content(self, response: httpx.Response, url: str) -> Dict[str, Any]:
+    async def scrape_as_completed(
+        self, urls: List[str], deadline: Optional[float] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Scrape multiple URLs concurrently, yielding each result as it finishes.
+        
+        Args:
+            urls: List of URLs to scrape
+            deadline: Optional number of seconds to wait for all URLs; any
+                still running then are cancelled and yielded as failures
+            
+        Yields:
+            (url, scraped content) pairs in completion order
+        """
+        tasks = {asyncio.ensure_future(self.scrape_url(group[0])): group for group in self._group_by_canonical(urls)}
+        pending = set(tasks)
+        end = None if deadline is None else time.monotonic() + deadline
+        try:
+            while pending:
+                timeout = None if end is None else max(end - time.monotonic(), 0)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    group = tasks[task]
+                    if task.exception() is not None:
+                        result = self._error_result(group[0], f'Exception during scraping: {str(task.exception())}')
+                    else:
+                        result = task.result()
+                    for url in group:
+                        yield url, result
+            
+            # Whatever is left missed the deadline
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in pending:
+                group = tasks[task]
+                result = self._error_result(group[0], f'Deadline of {deadline}s exceeded')
+                for url in group:
+                    yield url, result
+        finally:
+            # Wait for cancelled scrapes to unwind, so they release their
+            # responses and semaphore slots before the clients are closed
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    def _group_by_canonical(self, urls: List[str]) -> List[List[str]]:
+        """
+        Group URLs that point to the same page, preserving first-seen order.
+        
+        Args:
+            urls: List of URLs
+            
+        Returns:
+            Lists of distinct original URLs, one list per canonical URL
+        """
+        canonical_to_originals: Dict[str, List[str]] = {}
+        for url in dict.fromkeys(urls):
+            canonical_to_originals.setdefault(canonicalize_url(url), []).append(url)
+        return list(canonical_to_originals.values())
+    
+    async def _parse_content(self, response: httpx.Response, body: bytes, url: str) -> Dict[str, Any]:
         """
         Parse HTML content and extract relevant information.
         
         Args:
             response: HTTP response object
+            body: The response body
             url: The URL of the page
             
         Returns:
@@ -173,28 +605,14 @@ class WebScraper:
                     'images': []
                 }
             
-            # Parse HTML content
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract title
-            title = self._extract_title(soup)
-            
-            # Extract main content
-            content = self._extract_main_content(soup)
-            
-            # Extract links
-            links = self._extract_links(soup, url)
-            
-            # Extract images
-            images = self._extract_images(soup, url)
-            
-            return {
-                'url': url,
-                'title': title,
-                'content': content,
-                'links': links,
-                'images': images
-            }
+            # Parsing is CPU-bound; with a pool it runs on other cores while
+            # the event loop keeps driving the downloads
+            if self._pool is not None:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._pool, self._parse_html, body, response.charset_encoding, url
+                )
+            return self._parse_html(body, response.charset_encoding, url)
             
         except Exception as e:
             return {
@@ -205,66 +623,100 @@ class WebScraper:
                 'images': []
             }
     
-    def _extract_title(self, soup: BeautifulSoup) -> str:
+    @classmethod
+    def _parse_html(cls, body: bytes, encoding: Optional[str], url: str) -> Dict[str, Any]:
+        """
+        Parse an HTML page and extract its title, content, links and images.
+        
+        Pure and picklable, so it can run in a worker process.
+        
+        Args:
+            body: The raw response body
+            encoding: Charset from the response headers, if any
+            url: The URL of the page
+            
+        Returns:
+            Dictionary containing parsed content
+        """
+        from lxml import html
+        
+        # Hand lxml the raw bytes so it decodes in C using the charset
+        # from the headers, if any
+        root = html.document_fromstring(body, parser=_html_parser(encoding))
+        
+        # Extract title
+        title = cls._extract_title(root)
+        
+        # Extract main content
+        content = cls._extract_main_content(root)
+        
+        # Extract links
+        links = cls._extract_links(root, url)
+        
+        # Extract images
+        images = cls._extract_images(root, url)
+        
+        return {
+            'url': url,
+            'title': title,
+            'content': content,
+            'links': links,
+            'images': images
+        }
+    
+    @staticmethod
+    def _extract_title(root: html.HtmlElement) -> str:
         """Extract page title."""
         try:
-            title_tag = soup.find('title')
-            if title_tag:
-                return title_tag.get_text().strip()
+            title_tag = root.find('.//title')
+            if title_tag is not None:
+                return title_tag.text_content().strip()
             
             # Try other title-like elements
-            h1_tag = soup.find('h1')
-            if h1_tag:
-                return h1_tag.get_text().strip()
+            h1_tag = root.find('.//h1')
+            if h1_tag is not None:
+                return h1_tag.text_content().strip()
                 
             return 'No title found'
         except Exception:
             return 'Error extracting title'
     
-    def _extract_main_content(self, soup: BeautifulSoup) -> str:
+    @classmethod
+    def _extract_main_content(cls, root: html.HtmlElement) -> str:
         """
         Extract main content from HTML, trying multiple strategies.
         
         Args:
-            soup: BeautifulSoup object
+            root: Root element of the parsed page
             
         Returns:
             Extracted text content
         """
         try:
             # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header", "aside"]):
-                script.decompose()
-            
-            # Try to find main content areas
-            content_selectors = [
-                'main',
-                'article',
-                '[role="main"]',
-                '.content',
-                '.main-content',
-                '#content',
-                '.post-content',
-                '.entry-content',
-                'body'
-            ]
+            for element in list(root.iter('script', 'style', 'nav', 'footer', 'header', 'aside')):
+                element.drop_tree()
             
+            # Try to find main content areas, keeping the text of the last
+            # candidate looked at so the chosen one is not materialized twice
             content_element = None
-            for selector in content_selectors:
-                content_element = soup.select_one(selector)
-                if content_element and len(content_element.get_text().strip()) > 100:
-                    break
-            
-            if not content_element:
-                content_element = soup
+            raw = None
+            for content_element in cls._content_candidates(root):
+                if content_element is not None:
+                    raw = content_element.text_content()
+                    if len(raw.strip()) > 100:
+                        break
             
             # Extract text and clean it
-            text = content_element.get_text()
+            if content_element is None:
+                raw = root.text_content()
             
-            # Clean up the text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
+            # Collapse whitespace runs in one C-level pass. Only the first
+            # 5000 characters are kept, so clean a prefix first and fall
+            # back to the whole text only if that came out too short.
+            text = _WHITESPACE_RE.sub(' ', raw[:_CLEAN_PREFIX]).strip()
+            if len(text) <= 5000 and len(raw) > _CLEAN_PREFIX:
+                text = _WHITESPACE_RE.sub(' ', raw).strip()
             
             # Limit content length to prevent overwhelming the LLM
             if len(text) > 5000:
@@ -275,14 +727,56 @@ class WebScraper:
         except Exception as e:
             return f'Error extracting content: {str(e)}'
     
-    def _extract_links(self, soup: BeautifulSoup, base_url: str) -> List[Dict[str, str]]:
+    @classmethod
+    def _content_candidates(cls, root: html.HtmlElement) -> Iterator[Optional[html.HtmlElement]]:
+        """
+        Yield the first element of each main content candidate, best first.
+        
+        Candidates are looked up lazily: the attribute scan only runs if
+        neither <main> nor <article> had enough text.
+        
+        Args:
+            root: Root element of the parsed page
+            
+        Yields:
+            <main>, <article>, the attribute matches, then <body>; None for
+            candidates not on the page
+        """
+        yield root.find('.//main')
+        yield root.find('.//article')
+        
+        slots: List[Optional[html.HtmlElement]] = [None] * 6
+        class_slots = cls._CONTENT_CLASS_SLOTS
+        missing = len(slots)
+        for element in _content_attr_xpath()(root):
+            if slots[0] is None and element.get('role') == 'main':
+                slots[0] = element
+                missing -= 1
+            if slots[3] is None and element.get('id') == 'content':
+                slots[3] = element
+                missing -= 1
+            for name in (element.get('class') or '').split():
+                slot = class_slots.get(name)
+                if slot is not None and slots[slot] is None:
+                    slots[slot] = element
+                    missing -= 1
+            if not missing:
+                break
+        yield from slots
+        
+        yield root.find('.//body')
+    
+    @staticmethod
+    def _extract_links(root: html.HtmlElement, base_url: str) -> List[Dict[str, str]]:
         """Extract links from the page."""
         try:
             links = []
-            for link in soup.find_all('a', href=True):
-                href = link['href']
+            for link in root.iter('a'):
+                href = link.get('href')
+                if href is None:
+                    continue
                 absolute_url = urljoin(base_url, href)
-                text = link.get_text().strip()
+                text = link.text_content().strip()
                 
                 # Skip empty links and anchors
                 if not text or href.startswith('#') or href.startswith('mailto:'):
@@ -305,12 +799,15 @@ class WebScraper:
         except Exception:
             return []
     
-    def _extract_images(self, soup: BeautifulSoup, base_url: str) -> List[Dict[str, str]]:
+    @staticmethod
+    def _extract_images(root: html.HtmlElement, base_url: str) -> List[Dict[str, str]]:
         """Extract images from the page."""
         try:
             images = []
-            for img in soup.find_all('img', src=True):
-                src = img['src']
+            for img in root.iter('img'):
+                src = img.get('src')
+                if src is None:
+                    continue
                 absolute_url = urljoin(base_url, src)
                 alt = img.get('alt', '').strip()
                 
@@ -327,17 +824,20 @@ class WebScraper:
         except Exception:
             return []
     
-    def _is_valid_url(self, url: str) -> bool:
+    @staticmethod
+    def _is_valid_url(url: str) -> bool:
         """Check if a URL is valid."""
-        try:
-            result = urlparse(url)
-            return all([result.scheme, result.netloc]) and result.scheme in ['http', 'https']
-        except Exception:
-            return False
+        return _URL_RE.match(url) is not None
     
     async def close(self):
-        """Close the HTTP client."""
+        """Close the HTTP client, the parsing processes and the page cache."""
         await self.client.aclose()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._http1_client is not None:
+            await self._http1_client.aclose()
+        if self.cache is not None:
+            self.cache.close()
     
     async def __aenter__(self):
         return self
@@ -1,7 +1,9 @@
-import requests
-import json
+import httpx
+import orjson
+import asyncio
+import random
 from typing import Dict, List, Optional, Any
-import re
+from urllib.parse import urlsplit
 
 class QwantSearch:
     """A reusable client for the Qwant search API."""
@@ -13,7 +15,6 @@ class QwantSearch:
         'Accept-Language': 'en-US,en;q=0.5',
         'Referer': 'https://www.qwant.com/',
         'Origin': 'https://www.qwant.com',
-        'Connection': 'keep-alive',
         'Sec-Fetch-Dest': 'empty',
         'Sec-Fetch-Mode': 'cors',
         'Sec-Fetch-Site': 'same-site',
@@ -33,8 +34,16 @@ class QwantSearch:
             'euconsent-v2': 'CQGRvoAQGRvoAAHABBENBKFgAAAAAAAAAAqIAAAAAAAA.YAAAAAAAAAAA',
             'datadome': 'NXcXWUqx3NE9WDEu_2prgZN3wIOFUFlnDWr~_bW_MsbnRWBaZDlf~d0sxqXxnTM9_lJ79GKda_pxXuPpmepKLBagMNQKjCTQLcBA6AX9vjSojH_wefDpAnLtCZaS2MRh',
         }
+        # One session for all searches, so repeated and paginated queries
+        # reuse the keep-alive connection to api.qwant.com
+        self._client = httpx.AsyncClient(
+            headers=self.DEFAULT_HEADERS,
+            cookies=self.cookies,
+            timeout=10,
+            http2=True,
+        )
     
-    def search(
+    async def search(
         self, 
         query: str, 
         count: int = 10, 
@@ -61,7 +70,7 @@ class QwantSearch:
             
         Raises:
             ValueError: If parameters don't meet API requirements
-            requests.exceptions.RequestException: If the request fails
+            Exception: If the request fails or the response is not JSON
         """
         # Validate parameters according to API requirements
         if count != 10:
@@ -88,18 +97,50 @@ class QwantSearch:
         }
         
         try:
-            response = requests.get(
-                self.BASE_URL,
-                params=params,
-                cookies=self.cookies,
-                headers=self.DEFAULT_HEADERS,
-                timeout=10
-            )
+            response = await self._client.get(self.BASE_URL, params=params)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return orjson.loads(response.content)
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
             raise Exception(f"Qwant API request failed: {str(e)}") from e
     
+    async def search_all(self, query: str, pages: int = 5, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Fetch several result pages of a query concurrently.
+        
+        The API only returns 10 results per call, so the offsets are
+        requested at once, at most three at a time and slightly staggered
+        to stay clear of rate limits. A page that fails (e.g. rate limited)
+        is skipped, so the pages that succeeded are still returned.
+        
+        Args:
+            query: Search query
+            pages: Number of pages of 10 results to fetch (at most 5)
+            **kwargs: Additional search parameters
+            
+        Returns:
+            List of parsed web results, in page order
+            
+        Raises:
+            Exception: The first page's error, if every page failed
+        """
+        semaphore = asyncio.Semaphore(3)
+        
+        async def fetch_page(offset: int) -> List[Dict[str, Any]]:
+            async with semaphore:
+                await asyncio.sleep(random.uniform(0, 0.1))
+                return self.parse_web_results(await self.search(query, offset=offset, **kwargs))
+        
+        pages_results = await asyncio.gather(
+            *(fetch_page(10 * i) for i in range(min(pages, 5))), return_exceptions=True
+        )
+        if pages_results and all(isinstance(page, Exception) for page in pages_results):
+            raise pages_results[0]
+        return [result for page in pages_results if not isinstance(page, Exception) for result in page]
+    
+    async def aclose(self):
+        """Close the HTTP session."""
+        await self._client.aclose()
+    
     def parse_web_results(self, response_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Parse the web search results from the API response.
@@ -115,14 +156,22 @@ class QwantSearch:
             raise ValueError(f"API error: {error_msg}")
         
         results = []
+        split = urlsplit
         if 'mainline' in response_data['data']['result']['items']:
             for item in response_data['data']['result']['items']['mainline']:
                 if item['type'] == 'web':
                     for result in item['items']:
+                        source = result.get('source', '')
+                        # The hostname drops any port and userinfo; bare
+                        # hosts without a scheme are handled the same way
+                        try:
+                            domain = split(source if '//' in source else '//' + source).hostname or ''
+                        except ValueError:  # e.g. a malformed IPv6 host
+                            domain = ''
                         results.append({
                             'title': result.get('title', ''),
                             'url': result.get('url', ''),
-                            'domain': result.get('source', '').replace('https://', '').replace('http://', '').split('/')[0],
+                            'domain': domain,
                             'description': result.get('desc', ''),
                             'favicon': result.get('favicon', ''),
                             'thumbnail': result.get('thumbnailUrl', '')
@@ -142,21 +191,22 @@ class QwantSearch:
         if response_data.get('status') != 'success':
             return []
         
-        related = []
+        # Dict keys dedupe in one pass and keep the API's ranking order
+        related: Dict[str, None] = {}
         if 'mainline' in response_data['data']['result']['items']:
             for item in response_data['data']['result']['items']['mainline']:
                 if item['type'] == 'related_searches':
                     for result in item['items']:
-                        related.append(result.get('query', ''))
+                        related.setdefault(result.get('query', ''), None)
         
         # Also check sidebar related searches
         if 'sidebar' in response_data['data']['result']['items']:
             for item in response_data['data']['result']['items']['sidebar']:
                 if item.get('type') == 'related_searches':
                     for result in item['items']:
-                        related.append(result.get('query', ''))
+                        related.setdefault(result.get('query', ''), None)
                         
-        return list(set(related))  # Remove duplicates
+        return [query for query in related if query]
     
     def get_knowledge_panel(self, response_data: Dict[str, Any]) -> Dict[str, Any]:
         """
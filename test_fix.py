@@ -3,7 +3,7 @@
 Test script to verify the fix for the validation error.
 """
 
-import asyncio
+import pocketflow
 from pocketflow import Flow, Params
 from nodes import ChainOfThoughtNode
 from search import QwantSearch
@@ -40,6 +40,8 @@ async def main():
         print(f"Final result: {result}")
     except Exception as e:
         print(f"\nTest failed with error: {str(e)}")
+    finally:
+        await search_client.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    pocketflow.run(main())
\ No newline at end of file
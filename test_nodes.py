@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for ChainOfThoughtNode that run without network access.
+
+Requires pytest: uv run pytest test_nodes.py
+"""
+
+import asyncio
+
+import nodes
+from nodes import ChainOfThoughtNode, _normalize_query
+from pocketflow import Flow, Params
+
+def test_normalize_query_ignores_case_and_whitespace():
+    assert _normalize_query("  Python   TO\trust ") == "python to rust"
+
+def test_normalize_query_keeps_word_order():
+    assert _normalize_query("python to rust") != _normalize_query("rust to python")
+    assert _normalize_query("dog bites man") != _normalize_query("man bites dog")
+
+def test_step_limit_stops_a_model_that_never_finishes(monkeypatch, capsys):
+    """A model that always asks for another thought is stopped after max_steps thoughts."""
+    calls = []
+
+    async def never_done(prompt, system=None, stream=False, validate=None):
+        calls.append(prompt)
+        response = {
+            "current_thinking": f"Thought {len(calls)}",
+            "planning": [{"description": "Keep thinking", "status": "Pending"}],
+            "next_thought_needed": True,
+        }
+        return validate(response) if validate else response
+
+    monkeypatch.setattr(nodes, "acall_llm", never_done)
+
+    async def run():
+        node = ChainOfThoughtNode(max_steps=3, verbose=False)
+        flow = Flow(node)
+        flow.edge("continue", node)
+        ctx = {}
+        try:
+            await flow.run(ctx, Params({"problem": "Count forever"}))
+        finally:
+            await node.__aexit__(None, None, None)
+        return ctx
+
+    ctx = asyncio.run(run())
+    assert len(calls) == 3
+    assert len(ctx["thoughts"]) == 3
+    assert not ctx["thoughts"][-1].next_thought_needed
+    # Nothing is printed when the node is not verbose
+    assert "[STEP LIMIT]" not in capsys.readouterr().out
+
+def test_search_from_old_loop_does_not_forget_newer_fetch(monkeypatch):
+    """A fetch finishing on one event loop leaves another loop's in-flight fetch registered."""
+    monkeypatch.setattr(nodes, "_search_cache", {})
+    monkeypatch.setattr(nodes, "_search_inflight", {})
+    gates = {}
+
+    async def fetch_search(self, query, key):
+        await gates[asyncio.get_running_loop()]
+        return [{"title": "Result", "url": "https://example.com", "snippet": ""}]
+
+    monkeypatch.setattr(ChainOfThoughtNode, "_fetch_search", fetch_search)
+    node = ChainOfThoughtNode(verbose=False)
+    loop_a, loop_b = asyncio.new_event_loop(), asyncio.new_event_loop()
+    try:
+        searches = {}
+        for loop in (loop_a, loop_b):
+            gates[loop] = loop.create_future()
+            searches[loop] = loop.create_task(node._search("some query"))
+            loop.run_until_complete(asyncio.sleep(0))
+        newer = nodes._search_inflight["some query"]
+        assert newer.get_loop() is loop_b
+
+        # The first loop's fetch finishes while the second one's is still running
+        gates[loop_a].set_result(None)
+        loop_a.run_until_complete(searches[loop_a])
+        assert nodes._search_inflight["some query"] is newer
+
+        gates[loop_b].set_result(None)
+        loop_b.run_until_complete(searches[loop_b])
+        assert "some query" not in nodes._search_inflight
+    finally:
+        loop_a.close()
+        loop_b.close()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for the pocketflow engine that run without network access.
+
+Requires pytest: uv run pytest test_pocketflow.py
+"""
+
+import asyncio
+from collections import ChainMap
+
+import pytest
+
+import pocketflow
+from pocketflow import BatchFlow, Flow, Node, Params, Retry
+
+class Step(Node):
+    """Records its name in the run's ctx, then follows action; returns the order so far."""
+
+    def __init__(self, name, action="end", running=None):
+        self.name = name
+        self.action = action
+        self.running = running
+
+    async def __call__(self, ctx, p):
+        if self.running is not None:
+            self.running["now"] += 1
+            self.running["peak"] = max(self.running["peak"], self.running["now"])
+        try:
+            await asyncio.sleep(0.01)
+            ctx.setdefault("order", []).append(self.name)
+        finally:
+            if self.running is not None:
+                self.running["now"] -= 1
+        return self.action, list(ctx["order"])
+
+class SubFlow(Node):
+    """Runs an inner flow as a single step of the outer one."""
+
+    def __init__(self, flow, action):
+        self.flow = flow
+        self.action = action
+
+    async def __call__(self, ctx, p):
+        await self.flow.run(ctx, p)
+        return self.action, None
+
+def test_flow_follows_edges_in_order():
+    flow = Flow(Step("a", "to_b"))
+    flow.edge("to_b", Step("b", "to_c"))
+    flow.edge("to_c", Step("c"))
+    assert pocketflow.run(flow.run({})) == ["a", "b", "c"]
+
+def test_nested_flows_under_smaller_semaphore_than_fan_out():
+    """Five runs of a multi-node flow with a nested flow finish, in order, with two slots."""
+    running = {"now": 0, "peak": 0}
+    inner = Flow(Step("inner1", "next", running))
+    inner.edge("next", Step("inner2", "end", running))
+    outer = Flow(Step("first", "nested", running))
+    outer.edge("nested", SubFlow(inner, "last"))
+    outer.edge("last", Step("last", "end", running))
+
+    async def run():
+        semaphore = asyncio.Semaphore(2)
+        runs = [outer.run(ChainMap({}, {}), Params({"run": i}), semaphore=semaphore) for i in range(5)]
+        # Slots are held per node, not per chain, so this finishes instead of hanging
+        return await asyncio.wait_for(asyncio.gather(*runs), 5)
+
+    results = pocketflow.run(run())
+    assert results == [["first", "inner1", "inner2", "last"]] * 5
+    assert running["peak"] <= 2
+
+class Sleep(Node):
+    """Sleeps for the run's "delay" param, recording in finished when it unwinds."""
+
+    def __init__(self, finished):
+        self.finished = finished
+
+    async def __call__(self, ctx, p):
+        try:
+            await asyncio.sleep(p.data["delay"])
+        finally:
+            self.finished.append(p.data["delay"])
+        return "end", p.data["delay"]
+
+def test_as_completed_yields_in_completion_order():
+    batch = BatchFlow(Sleep([]))
+
+    async def run():
+        params = [Params({"delay": delay}) for delay in (0.06, 0.02, 0.04)]
+        return [pair async for pair in batch.as_completed({}, params)]
+
+    assert pocketflow.run(run()) == [(1, 0.02), (2, 0.04), (0, 0.06)]
+
+def test_as_completed_timeout():
+    """A run exceeding the timeout yields its TimeoutError; the others still finish."""
+    batch = BatchFlow(Sleep([]))
+
+    async def run():
+        params = [Params({"delay": 5}), Params({"delay": 0.01})]
+        return [pair async for pair in batch.as_completed({}, params, timeout=0.1)]
+
+    (fast, fast_value), (slow, slow_value) = pocketflow.run(run())
+    assert (fast, fast_value) == (1, 0.01)
+    assert slow == 0 and isinstance(slow_value, asyncio.TimeoutError)
+
+def test_as_completed_cancels_when_consumer_stops():
+    """Stopping early cancels the remaining runs, and their finally blocks complete."""
+    finished = []
+    batch = BatchFlow(Sleep(finished))
+
+    async def run():
+        params = [Params({"delay": delay}) for delay in (0.01, 5, 6)]
+        results = batch.as_completed({}, params)
+        async for pair in results:
+            break
+        await results.aclose()
+        return pair, sorted(finished)
+
+    pair, finished_runs = pocketflow.run(run())
+    assert pair == (0, 0.01)
+    assert finished_runs == [0.01, 5, 6]
+
+class Flaky(Node):
+    """Fails with a numbered error until its failures run out, then succeeds."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+
+    async def __call__(self, ctx, p):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ValueError(f"attempt {self.attempts}")
+        return "end", self.attempts
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record asyncio.sleep delays instead of sleeping."""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    return delays
+
+def test_retry_backoff_doubles_up_to_cap(sleeps):
+    inner = Flaky(failures=10)
+    retry = Retry(inner, tries=6, backoff=1.0, cap=3.0, jitter=False)
+    with pytest.raises(ValueError, match="attempt 6"):
+        pocketflow.run(retry({}, Params({})))
+    assert inner.attempts == 6
+    assert sleeps == [1.0, 2.0, 3.0, 3.0, 3.0]
+
+def test_retry_jitter_stays_within_cap(sleeps):
+    """Jittered sleeps are drawn from [delay / 2, delay] and never exceed the cap."""
+    retry = Retry(Flaky(failures=50), tries=40, backoff=0.5, cap=2.0)
+    with pytest.raises(ValueError, match="attempt 40"):
+        pocketflow.run(retry({}, Params({})))
+    assert len(sleeps) == 39
+    assert all(0.25 <= delay <= 2.0 for delay in sleeps)
+    # Once the delay reaches the cap, each sleep is at least half of it
+    assert all(delay >= 1.0 for delay in sleeps[2:])
+
+def test_retry_returns_first_success(sleeps):
+    assert pocketflow.run(Retry(Flaky(failures=2), tries=3)({}, Params({}))) == ("end", 3)
+    assert len(sleeps) == 2
@@ -3,7 +3,7 @@
 Test script for the web scraper functionality.
 """
 
-import asyncio
+import pocketflow
 from scraper import WebScraper, scrape_url, scrape_urls
 
 async def test_single_scraping():
@@ -68,4 +68,4 @@ async def main():
     await test_scraper_class()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    pocketflow.run(main())
\ No newline at end of file
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Tests for the web scraper that run without network access.
+"""
+
+import asyncio
+import os
+import tempfile
+
+import httpx
+
+import pocketflow
+from scraper import WebScraper, canonicalize_url
+
+PAGE = b"<html><head><title>Cached page</title></head><body><main><p>Hello there.</p></main></body></html>"
+
+async def run_scraper(handler, urls, **kwargs):
+    """
+    Scrape urls in order with a WebScraper whose requests are answered by handler.
+    
+    Returns:
+        The scrape results, in the same order as urls
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = await open_scraper(handler, tmp, **kwargs)
+        try:
+            return [await scraper.scrape_url(url) for url in urls]
+        finally:
+            await scraper.close()
+
+async def open_scraper(handler, tmp, **kwargs):
+    """Create a WebScraper caching in tmp, whose requests are answered by handler."""
+    scraper = WebScraper(cache_path=os.path.join(tmp, "pages.sqlite"), delay=0, **kwargs)
+    await scraper.client.aclose()
+    scraper.client = httpx.AsyncClient(transport=httpx.MockTransport(handler), **scraper._client_kwargs)
+    return scraper
+
+def test_canonical_scheme_and_host_case():
+    """Scheme and host are case-insensitive; the path is not."""
+    assert canonicalize_url("HTTPS://Example.COM/Path") == "https://example.com/Path"
+
+def test_canonical_default_port():
+    """The scheme's default port is dropped; other ports are kept."""
+    assert canonicalize_url("https://example.com:443/a") == "https://example.com/a"
+    assert canonicalize_url("http://example.com:80/a") == "http://example.com/a"
+    assert canonicalize_url("http://example.com:443/a") == "http://example.com:443/a"
+    assert canonicalize_url("https://example.com:8443/a") == "https://example.com:8443/a"
+
+def test_canonical_fragment():
+    assert canonicalize_url("https://example.com/a#section-2") == "https://example.com/a"
+
+def test_canonical_tracking_params():
+    """Tracking parameters are dropped; other parameters keep their order."""
+    url = "https://example.com/a?utm_source=x&id=3&fbclid=y&page=2&utm_medium=z"
+    assert canonicalize_url(url) == "https://example.com/a?id=3&page=2"
+
+def test_canonical_trailing_slash():
+    assert canonicalize_url("https://example.com/a/") == "https://example.com/a"
+    assert canonicalize_url("https://example.com/") == canonicalize_url("https://example.com")
+
+def test_not_modified_reuses_cached_page():
+    """A stale page is revalidated with its ETag, and a 304 serves the cached copy."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=PAGE, headers={"content-type": "text/html", "etag": '"v1"'})
+
+    url = "https://example.com/page"
+    first, second = pocketflow.run(run_scraper(handler, [url, url], cache_ttl=0))
+    assert first["success"] and first["title"] == "Cached page"
+    assert second == first
+    assert len(requests) == 2
+    assert requests[1].headers["if-none-match"] == '"v1"'
+
+def test_not_found_is_not_fetched_again():
+    """A 404 puts the URL on the negative cache, so it is not requested again."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(404)
+
+    url = "https://example.com/missing"
+    first, second = pocketflow.run(run_scraper(handler, [url, url + "/"]))
+    assert not first["success"]
+    assert second["error"] == "Page not found (cached)"
+    assert len(requests) == 1
+
+def test_empty_document_is_an_error():
+    """An empty or whitespace-only page fails, and is fetched again next time."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=b"" if request.url.path == "/empty" else b" \r\n\t ",
+                              headers={"content-type": "text/html"})
+
+    urls = ["https://example.com/empty", "https://example.com/blank", "https://example.com/blank"]
+    results = pocketflow.run(run_scraper(handler, urls))
+    assert results == [WebScraper._error_result(url, "Empty document") for url in urls]
+    assert len(requests) == 3
+
+def test_robots_disallow_skips_url():
+    """URLs disallowed by robots.txt are skipped without being requested."""
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        if request.url.path == "/robots.txt":
+            return httpx.Response(200, text="User-agent: *\nDisallow: /private\n")
+        return httpx.Response(200, content=PAGE, headers={"content-type": "text/html"})
+
+    blocked, allowed = pocketflow.run(run_scraper(
+        handler,
+        ["https://example.com/private/page", "https://example.com/public"],
+        respect_robots=True,
+    ))
+    assert blocked["error"] == "Disallowed by robots.txt"
+    assert allowed["success"]
+    assert paths == ["/robots.txt", "/public"]
+
+def test_scrape_as_completed_cleans_up_when_stopped_early():
+    """Scrapes still running when the consumer stops are cancelled and finish unwinding."""
+    unwound = []
+
+    async def handler(request):
+        if request.url.path.startswith("/slow"):
+            try:
+                await asyncio.sleep(10)
+            finally:
+                unwound.append(request.url.path)
+        return httpx.Response(200, content=PAGE, headers={"content-type": "text/html"})
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            scraper = await open_scraper(handler, tmp, max_concurrency=4)
+            try:
+                urls = ["https://example.com/fast", "https://example.com/slow1", "https://example.com/slow2"]
+                results = scraper.scrape_as_completed(urls)
+                async for url, result in results:
+                    break
+                await results.aclose()
+                # Both slow requests were cancelled and their slots given back
+                return url, result, sorted(unwound), scraper._sem.locked(), scraper._sem._value
+            finally:
+                await scraper.close()
+
+    url, result, slow, locked, free = pocketflow.run(run())
+    assert url == "https://example.com/fast" and result["success"]
+    assert slow == ["/slow1", "/slow2"]
+    assert not locked and free == 4
+
+def test_scrape_as_completed_deadline():
+    """Scrapes that miss the deadline are cancelled and yielded as failures."""
+    unwound = []
+
+    async def handler(request):
+        if request.url.path == "/slow":
+            try:
+                await asyncio.sleep(10)
+            finally:
+                unwound.append(request.url.path)
+        return httpx.Response(200, content=PAGE, headers={"content-type": "text/html"})
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            scraper = await open_scraper(handler, tmp)
+            try:
+                urls = ["https://example.com/fast", "https://example.com/slow"]
+                return [pair async for pair in scraper.scrape_as_completed(urls, deadline=0.2)]
+            finally:
+                await scraper.close()
+
+    (fast, fast_result), (slow, slow_result) = pocketflow.run(run())
+    assert fast == "https://example.com/fast" and fast_result["success"]
+    assert slow == "https://example.com/slow"
+    assert slow_result["error"] == "Deadline of 0.2s exceeded"
+    assert unwound == ["/slow"]
+
+def parse_page(body):
+    """The main content _parse_html extracts from an HTML body."""
+    return WebScraper._parse_html(body.encode(), "utf-8", "https://example.com/page")["content"]
+
+def test_main_outranks_content_class():
+    main = "Main article text. " * 10
+    body = f'<html><body><div class="content">{"Sidebar text. " * 10}</div><main>{main}</main></body></html>'
+    assert parse_page(body) == main.strip()
+
+def test_content_class_matches_whole_class_names():
+    """class="content-wrapper" is not class "content", so it does not outrank post-content."""
+    post = "Post body text. " * 10
+    body = (
+        f'<html><body><div class="content-wrapper">{"Wrapper text. " * 10}</div>'
+        f'<div class="meta post-content">{post}</div></body></html>'
+    )
+    assert parse_page(body) == post.strip()
+
+def test_falls_back_to_body():
+    """Without a content candidate the whole body is used, minus navigation and scripts."""
+    body = (
+        "<html><head><title>Title</title></head><body><nav>Menu</nav>"
+        "<p>First paragraph.</p><script>var x = 1;</script><p>Second paragraph.</p></body></html>"
+    )
+    assert parse_page(body) == "First paragraph.Second paragraph."
+
+def test_whitespace_heavy_prefix_uses_whole_text():
+    """When the cleaned prefix is too short, the rest of the page is cleaned as well."""
+    body = f"<html><body><main>Start{' ' * 25000}{'y' * 6000}</main></body></html>"
+    content = parse_page(body)
+    assert content == "Start " + "y" * 4994 + "... [content truncated]"
+
+def main():
+    """Run all tests."""
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,14 @@
 Test script for the Qwant search integration.
 """
 
+import pocketflow
 from search import QwantSearch
 
 def test_qwant_search():
+    """Run the async search test from synchronous code."""
+    pocketflow.run(_test_qwant_search())
+
+async def _test_qwant_search():
     """Test the Qwant search functionality."""
     print("Testing Qwant search integration...")
     
@@ -17,7 +22,7 @@ def test_qwant_search():
         query = "Milton Friedman economic theories"
         print(f"\nSearching for: {query}")
         
-        response = search_client.search(query)
+        response = await search_client.search(query)
         
         # Parse the results
         results = search_client.parse_web_results(response)
@@ -37,6 +42,8 @@ def test_qwant_search():
                 
     except Exception as e:
         print(f"Error: {str(e)}")
+    finally:
+        await search_client.aclose()
 
 if __name__ == "__main__":
     test_qwant_search()
\ No newline at end of file
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the Qwant search client that run without network access.
+"""
+
+import httpx
+import orjson
+
+import pocketflow
+from search import QwantSearch
+
+def page(offset):
+    """A Qwant API response with one web result for the given offset."""
+    return {
+        "status": "success",
+        "data": {"result": {"items": {"mainline": [{
+            "type": "web",
+            "items": [{"title": f"Result {offset}", "url": f"https://example.com/{offset}", "source": "example.com"}],
+        }]}}},
+    }
+
+async def run_search(handler, method, *args, **kwargs):
+    """Call a QwantSearch method with its requests answered by handler."""
+    client = QwantSearch()
+    await client._client.aclose()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        return await getattr(client, method)(*args, **kwargs)
+    finally:
+        await client.aclose()
+
+def test_search_all_returns_pages_in_order():
+    def handler(request):
+        return httpx.Response(200, content=orjson.dumps(page(int(request.url.params["offset"]))))
+
+    results = pocketflow.run(run_search(handler, "search_all", "query", pages=3))
+    assert [result["title"] for result in results] == ["Result 0", "Result 10", "Result 20"]
+
+def test_search_all_skips_failed_pages():
+    """A rate-limited page is left out; the pages that succeeded are kept."""
+    def handler(request):
+        offset = int(request.url.params["offset"])
+        if offset == 40:
+            return httpx.Response(429)
+        return httpx.Response(200, content=orjson.dumps(page(offset)))
+
+    results = pocketflow.run(run_search(handler, "search_all", "query", pages=5))
+    assert [result["title"] for result in results] == ["Result 0", "Result 10", "Result 20", "Result 30"]
+
+def test_search_all_raises_when_every_page_fails():
+    def handler(request):
+        return httpx.Response(503)
+
+    try:
+        pocketflow.run(run_search(handler, "search_all", "query", pages=2))
+    except Exception as e:
+        assert "Qwant API request failed" in str(e)
+    else:
+        raise AssertionError("search_all should fail when no page succeeds")
+
+def test_search_wraps_non_json_response():
+    """An HTML block page served with a 200 fails like any other request error."""
+    def handler(request):
+        return httpx.Response(200, text="<html>Please verify you are human</html>")
+
+    try:
+        pocketflow.run(run_search(handler, "search", "query"))
+    except Exception as e:
+        assert "Qwant API request failed" in str(e)
+        assert isinstance(e.__cause__, orjson.JSONDecodeError)
+    else:
+        raise AssertionError("search should fail on a non-JSON response")
+
+def main():
+    """Run all tests."""
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
+
+if __name__ == "__main__":
+    main()
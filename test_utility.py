@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM utilities that run without network access.
+
+Requires pytest: uv run pytest test_utility.py
+"""
+
+import asyncio
+import dataclasses
+from types import SimpleNamespace
+
+import pytest
+
+import utility
+from nodes import ChainOfThoughtNode
+
+VALID_RESPONSE = (
+    '{"current_thinking": "x", "planning": '
+    '[{"description": "Answer", "status": "Pending"}], "next_thought_needed": true}'
+)
+
+class FakeModels:
+    """Stands in for client.models, answering every request with the next canned text."""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.calls = 0
+
+    async def generate_content(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(text=self.texts.pop(0))
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Route acall_llm to a fake client, with fresh caches and no semantic cache."""
+    models = FakeModels([])
+    client = SimpleNamespace(models=models)
+    monkeypatch.setattr(utility, "_get_async_client", lambda: client)
+    monkeypatch.setattr(utility, "prompt_cache", utility.PromptCache(maxsize=16))
+    monkeypatch.setattr(utility, "semantic_cache", None)
+    return models
+
+def test_invalid_response_is_not_cached(fake_llm):
+    """A response rejected by the validator is requested again, not served from the cache."""
+    fake_llm.texts = ['{"current_thinking": "x"}', VALID_RESPONSE]
+    node = ChainOfThoughtNode(verbose=False)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await utility.acall_llm("prompt", validate=node._check_response)
+        return await utility.acall_llm("prompt", validate=node._check_response)
+
+    response = asyncio.run(run())
+    assert fake_llm.calls == 2
+    assert response["next_thought_needed"] is True
+    # The valid response is cached once it has passed validation
+    assert utility.prompt_cache.get("prompt") == response
+
+def test_semantic_cache_failure_is_a_miss(fake_llm, monkeypatch):
+    """An embedding error falls through to the LLM, and nothing is stored semantically."""
+    fake_llm.texts = [VALID_RESPONSE]
+    cache = utility.SemanticCache()
+
+    async def failing_embed(text):
+        raise RuntimeError("embedding service unavailable")
+
+    monkeypatch.setattr(cache, "embed", failing_embed)
+    monkeypatch.setattr(utility, "semantic_cache", cache)
+    response = asyncio.run(utility.acall_llm("prompt"))
+    assert fake_llm.calls == 1
+    assert response["current_thinking"] == "x"
+    assert cache._vectors == []
+
+def test_invalid_response_is_not_cached_semantically(fake_llm, monkeypatch):
+    """Only validated responses are stored in the semantic cache."""
+    fake_llm.texts = ['{"current_thinking": "x"}', VALID_RESPONSE]
+    cache = utility.SemanticCache()
+
+    async def embed(text):
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(cache, "embed", embed)
+    monkeypatch.setattr(utility, "semantic_cache", cache)
+    node = ChainOfThoughtNode(verbose=False)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await utility.acall_llm("prompt", validate=node._check_response)
+        assert cache._vectors == []
+        return await utility.acall_llm("prompt again", validate=node._check_response)
+
+    asyncio.run(run())
+    assert fake_llm.calls == 2
+    assert len(cache._vectors) == 1
+
+def test_embedding_uses_executor_slot(monkeypatch):
+    """Embedding requests are admitted through the loop's LLMExecutor."""
+    async def run():
+        executor = utility.LLMExecutor(max_concurrency=1)
+        monkeypatch.setattr(utility, "_get_executor", lambda: executor)
+        seen = []
+
+        async def embed_content(**kwargs):
+            # The only slot is held while the request is in flight
+            seen.append(executor._semaphore.locked())
+            return SimpleNamespace(embeddings=[SimpleNamespace(values=[3.0, 4.0])])
+
+        client = SimpleNamespace(models=SimpleNamespace(embed_content=embed_content))
+        monkeypatch.setattr(utility, "_get_async_client", lambda: client)
+        vector = await utility.SemanticCache().embed("text")
+        return seen, vector
+
+    seen, vector = asyncio.run(run())
+    assert seen == [True]
+    assert vector == [0.6, 0.8]
+
+def test_scan_ignores_braces_inside_strings():
+    text = '{"a": "} and {", "b": "quote \\" }"} trailing'
+    assert utility._scan_json_object(text, 0) == ('{"a": "} and {", "b": "quote \\" }"}', False)
+
+def test_scan_drops_trailing_commas():
+    text = '{"a": [1, 2,], "b": {"c": 3,},}'
+    object_text, truncated = utility._scan_json_object(text, 0)
+    assert object_text == '{"a": [1, 2], "b": {"c": 3}}'
+    assert not truncated
+
+def test_scan_closes_truncated_object():
+    text = '{"a": [1, {"b": "unfinished'
+    object_text, truncated = utility._scan_json_object(text, 0)
+    assert object_text == '{"a": [1, {"b": "unfinished"}]}'
+    assert truncated
+
+def test_scan_cuts_object_out_of_prose():
+    text = 'Here is the plan: {"a": {"b": 1}} Let me know if it helps {"c": 2}'
+    start = text.find("{")
+    assert utility._scan_json_object(text, start) == ('{"a": {"b": 1}}', False)
+
+def test_parse_marks_truncated_response():
+    parsed = utility._parse_llm_response('Answer: {"final_answer": "The result is 4')
+    assert parsed == {"final_answer": "The result is 4", utility.TRUNCATED_KEY: True}
+    assert utility.TRUNCATED_KEY not in utility._parse_llm_response('Answer: {"a": 1} done')
+
+def test_truncated_final_answer_is_rejected(fake_llm):
+    """A final answer repaired from a cut-off response fails validation and is not cached."""
+    fake_llm.texts = [
+        '{"current_thinking": "x", "planning": [], "next_thought_needed": false, '
+        '"final_answer": "The answer is'
+    ]
+    node = ChainOfThoughtNode(verbose=False)
+    with pytest.raises(ValueError, match="truncated"):
+        asyncio.run(utility.acall_llm("prompt", validate=node._check_response))
+    assert utility.prompt_cache.get("prompt") is None
+
+@pytest.mark.parametrize("text", [
+    'Here you go:\n```json\n{"a": 1, "b": [2]}\n```',
+    'Here you go:\n```JSON\n{"a": 1, "b": [2]}\n```',
+    'Here you go:\n```yaml\na: 1\nb:\n  - 2\n```',
+    'Here you go:\n```\n{"a": 1, "b": [2]}\n```',
+    'Here you go:\n```\na: 1\nb: [2]\n```',
+    'Here you go: ```{"a": 1, "b": [2]}```',
+])
+def test_parse_fenced_response(text):
+    assert utility._parse_llm_response(text) == {"a": 1, "b": [2]}
+
+@pytest.mark.parametrize("text", [
+    "Here you go:\n```python\nprint(1)\n```",
+    "Here you go:\n```\njust some words\n```",
+])
+def test_parse_rejects_fence_without_mapping(text):
+    """A code block in another language, or one holding only a string, is not a response."""
+    with pytest.raises(ValueError):
+        utility._parse_llm_response(text)
+
+def split_every(text, size):
+    """Cut text into chunks of size characters, ignoring token boundaries."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+@pytest.fixture
+def fake_stream(fake_llm, monkeypatch):
+    """Stream acall_llm responses from the chunks put in the returned list."""
+    chunks = []
+
+    async def astream_llm(prompt, system=None):
+        for chunk in chunks:
+            yield chunk
+
+    monkeypatch.setattr(utility, "astream_llm", astream_llm)
+    return chunks
+
+def test_streaming_decoder_handles_chunks_split_mid_token():
+    text = '{"count": 123, "ratio": 0.5, "name": "café \\"quoted\\"", "done": true, "items": [null]}'
+    for size in (1, 3, 7):
+        decoder = utility._StreamingJSON()
+        for chunk in split_every(text, size):
+            decoder.feed(chunk)
+        assert decoder.result() == {"count": 123, "ratio": 0.5, "name": 'café "quoted"', "done": True, "items": [None]}
+
+def test_streamed_response_is_decoded_and_cached(fake_stream):
+    fake_stream.extend(split_every(VALID_RESPONSE, 5))
+    response = asyncio.run(utility.acall_llm("prompt", stream=True))
+    assert response["planning"] == [{"description": "Answer", "status": "Pending"}]
+    assert utility.prompt_cache.get("prompt") == response
+
+@pytest.mark.parametrize("text", [
+    f"```json\n{VALID_RESPONSE}\n```",
+    f"Here is my reasoning: {VALID_RESPONSE} Hope that helps.",
+])
+def test_streamed_fenced_or_prose_response_falls_back(fake_stream, text):
+    """Text the incremental decoder rejects is still parsed once the stream ends."""
+    decoder = utility._StreamingJSON()
+    for chunk in split_every(text, 5):
+        decoder.feed(chunk)
+    assert decoder.result() is None
+
+    fake_stream.extend(split_every(text, 5))
+    response = asyncio.run(utility.acall_llm("prompt", stream=True))
+    assert response["next_thought_needed"] is True
+
+def test_streamed_truncated_response_is_marked_and_not_cached(fake_stream):
+    fake_stream.extend(split_every('{"current_thinking": "x", "planning": [{"description": "Ans', 4))
+    response = asyncio.run(utility.acall_llm("prompt", stream=True))
+    assert response[utility.TRUNCATED_KEY] is True
+    assert response["planning"] == [{"description": "Ans"}]
+    assert utility.prompt_cache.get("prompt") is None
+
+PLAN = [
+    {"description": "Find the population", "status": "Done", "result": "8.3 million", "sub_steps": [
+        {"description": "Search census data", "status": "Search Needed", "query": "NYC census 2020"},
+        {"description": "Check the source", "status": "Verification Needed", "mark": "Census page", "sub_steps": [
+            {"description": "Compare estimates", "status": "Pending"},
+        ]},
+        {"description": "Note the year", "status": "Done", "result": "2020"},
+    ]},
+    {"description": "Answer", "status": "Pending"},
+]
+
+def test_plan_step_round_trip_keeps_sub_step_order():
+    plan = [utility.PlanStep.from_dict(step) for step in PLAN]
+    assert [step.description for step in plan[0].sub_steps] == ["Search census data", "Check the source", "Note the year"]
+    assert plan[0].sub_steps[1].sub_steps[0].description == "Compare estimates"
+    # Every field the LLM sent survives, and missing ones are None or empty
+    assert utility.PlanStep.from_dict({"description": "a", "status": "Done"}) == utility.PlanStep("a", "Done")
+    assert dataclasses.asdict(plan[1]) == {
+        "description": "Answer", "status": "Pending", "result": None, "query": None, "mark": None, "sub_steps": [],
+    }
+    assert plan[0].sub_steps[0].query == "NYC census 2020"
+    assert plan[0].sub_steps[1].mark == "Census page"
+
+def test_format_plan_text():
+    plan = [utility.PlanStep.from_dict(step) for step in PLAN]
+    assert utility.format_plan(plan) == "\n".join([
+        "- Find the population [Done]",
+        "  Result: 8.3 million",
+        "  - Search census data [Search Needed]",
+        "    Query: NYC census 2020",
+        "  - Check the source [Verification Needed]",
+        "    Mark: Census page",
+        "    - Compare estimates [Pending]",
+        "  - Note the year [Done]",
+        "    Result: 2020",
+        "- Answer [Pending]",
+    ])
+
+def test_format_plan_deeper_than_indent_table():
+    """Nesting past the precomputed indents keeps indenting two spaces a level."""
+    depth = len(utility._INDENTS) + 8
+    step = {"description": f"Step {depth}", "status": "Pending"}
+    for level in reversed(range(depth)):
+        step = {"description": f"Step {level}", "status": "Pending", "sub_steps": [step]}
+    plan = [utility.PlanStep.from_dict(step)]
+    lines = utility.format_plan(plan).split("\n")
+    assert len(lines) == depth + 1
+    assert lines == [f"{'  ' * level}- Step {level} [Pending]" for level in range(depth + 1)]
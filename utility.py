@@ -1,52 +1,638 @@
 import os
+import sys
 import yaml
 import re
-import json
-from typing import Dict, Any, List
+import asyncio
+import weakref
+import hashlib
+import sqlite3
+import math
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from typing import Dict, Any, List, Callable, Optional, AsyncIterator, Tuple
+import orjson
+import ijson
+import httpx
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def call_llm(prompt: str) -> Dict[str, Any]:
+# Prefer the libyaml C loader; fall back to the pure-Python one if PyYAML
+# was built without libyaml.
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+MODEL = "gemini-2.5-flash"
+
+# Maximum number of LLM requests allowed in flight at once per event loop
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+
+# Maximum LLM requests started per second per event loop (0 means unlimited)
+LLM_MAX_RPS = float(os.environ.get("LLM_MAX_RPS", "0"))
+
+# Exact-match prompt cache settings. LLM_CACHE_SIZE=0 disables the cache;
+# LLM_CACHE_PATH enables an SQLite store that survives restarts
+# (e.g. ~/.cache/thoughtbot/prompts.sqlite).
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH")
+
+# Semantic cache settings. The semantic cache can return answers to prompts
+# that are only similar, so it is opt-in via LLM_SEMANTIC_CACHE=1.
+LLM_SEMANTIC_CACHE = os.environ.get("LLM_SEMANTIC_CACHE") == "1"
+LLM_SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("LLM_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+LLM_SEMANTIC_CACHE_TTL = float(os.environ.get("LLM_SEMANTIC_CACHE_TTL", "3600"))
+EMBEDDING_MODEL = os.environ.get("LLM_EMBEDDING_MODEL", "gemini-embedding-001")
+
+# Retries for rate-limited (429) and failed (5xx) LLM requests, with
+# exponential backoff from 1s capped at 30s plus up to 0.5s of jitter, so a
+# transient error is not answered with back-to-back requests
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+_HTTP_RETRY = types.HttpRetryOptions(
+    attempts=LLM_MAX_RETRIES + 1,
+    initial_delay=1.0,
+    max_delay=30.0,
+    exp_base=2,
+    jitter=0.5,
+    http_status_codes=[408, 429, 500, 502, 503, 504],
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Set to True in a parsed response whose JSON was cut off and had to be
+# closed by _parse_llm_response; such responses are never cached
+TRUNCATED_KEY = "_truncated"
+
+# Fallback patterns for _parse_llm_response, compiled once rather than
+# looked up in re's cache on every response
+# A fence's tag is the word before the first newline, so ```python is not
+# mistaken for an untagged block; group(1) is None when there is no tag
+_FENCE_RE = re.compile(r'```(?:([\w+-]+)[ \t]*\n)?\s*(.*?)\s*```', re.DOTALL)
+_JSON_OBJECT_RE = re.compile(r'{[^{}]*(?:{[^{}]*}[^{}]*)*}')
+
+# Tokens _scan_json_object steps over: a string (group 1 is its closing quote,
+# missing if the text ends first), a bracket or comma, or a run of anything
+# else up to the next one
+_JSON_TOKEN_RE = re.compile(r'"(?:[^"\\]+|\\.)*(?:(")|\\?\Z)|[{}\[\],]|[^\s"{}\[\],]+', re.DOTALL)
+
+# Async clients and executors are bound to the loop they were created in,
+# so they are created lazily and kept per running loop.
+_loop_resources: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+def _get_api_key() -> str:
+    """Return the Gemini API key, raising if it is not configured."""
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set")
+    return api_key
+
+def _loop_resource(name: str, factory: Callable[[], Any]) -> Any:
     """
-    Call the LLM with a prompt and return the parsed JSON response.
+    Get (or lazily create) a resource tied to the running event loop.
     
     Args:
-        prompt: The prompt to send to the LLM
+        name: Key identifying the resource
+        factory: Callable used to create the resource on first use
+        
     Returns:
-        Dictionary containing the parsed JSON response
+        The resource instance for the current loop
     """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable not set")
-    client = genai.Client(api_key=api_key)
-    model = "gemini-2.5-flash"
-    contents = [
+    loop = asyncio.get_running_loop()
+    resources = _loop_resources.setdefault(loop, {})
+    if name not in resources:
+        resources[name] = factory()
+    return resources[name]
+
+@lru_cache(maxsize=1)
+def _get_sync_client() -> genai.Client:
+    """
+    Return the process-wide Gemini client used by call_llm.
+    
+    It is created on first use, so importing this module does not need an
+    API key, and then reused so its connections are kept alive between calls.
+    Requests (and their retries) are multiplexed over one HTTP/2 connection.
+    """
+    http_options = types.HttpOptions(
+        client_args={
+            "http2": True,
+            "limits": httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60),
+        },
+        retry_options=_HTTP_RETRY,
+    )
+    return genai.Client(api_key=_get_api_key(), http_options=http_options)
+
+def _get_async_client() -> Any:
+    """
+    Return the async Gemini client for the running event loop.
+    
+    The client keeps one HTTP/2 connection pool, so concurrent requests are
+    multiplexed over a shared connection instead of each paying a new
+    TCP+TLS handshake.
+    """
+    def _create() -> Any:
+        http_options = types.HttpOptions(
+            async_client_args={
+                "http2": True,
+                "limits": httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            },
+            retry_options=_HTTP_RETRY,
+        )
+        return genai.Client(api_key=_get_api_key(), http_options=http_options).aio
+    return _loop_resource("client", _create)
+
+def _build_contents(prompt: str) -> List[types.Content]:
+    """Wrap a prompt into the content list expected by the Gemini API."""
+    return [
         types.Content(
             role="user",
             parts=[types.Part.from_text(text=prompt)],
         ),
     ]
-    generate_content_config = types.GenerateContentConfig(
+
+def _build_config(system: Optional[str] = None) -> types.GenerateContentConfig:
+    """Build the generation config shared by the sync and async LLM calls."""
+    return types.GenerateContentConfig(
+        system_instruction=system,
         temperature=0,
         top_p=0.9,
         response_mime_type="application/json",
         thinking_config=types.ThinkingConfig(thinking_budget=-1),
     )
-    response = client.models.generate_content(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
+
+class PromptCache:
+    """
+    Exact-match cache of parsed LLM responses keyed by a hash of the prompt.
+    
+    Entries are kept in an in-memory LRU and, if a path is given, mirrored to
+    an SQLite database so they survive process restarts. Responses are stored
+    serialized, so every hit returns a fresh dictionary that callers may mutate.
+    """
+    
+    def __init__(self, maxsize: int = 512, path: Optional[str] = None):
+        """
+        Initialize the prompt cache.
+        
+        Args:
+            maxsize: Maximum number of entries kept in memory
+            path: Optional SQLite file used to persist entries
+        """
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            path = os.path.expanduser(path)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prompts (hash TEXT PRIMARY KEY, response BLOB)"
+            )
+            self._db.commit()
+    
+    @staticmethod
+    def key(prompt: str, system: Optional[str] = None) -> str:
+        """
+        Return the cache key for a prompt and optional system prompt.
+        
+        Runs of whitespace are collapsed first, so prompts that differ only
+        in spacing or blank lines (e.g. in the embedded history) share a key.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        if system:
+            digest.update(system.encode())
+            digest.update(b"\0")
+        digest.update(_WHITESPACE_RE.sub(" ", prompt).strip().encode())
+        return digest.hexdigest()
+    
+    def get(self, prompt: str, system: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up the cached response for a prompt.
+        
+        Args:
+            prompt: The prompt sent to the LLM
+            system: Optional system prompt sent with it
+            
+        Returns:
+            The parsed response, or None on a miss
+        """
+        if self.maxsize <= 0:
+            return None
+        key = self.key(prompt, system)
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        elif self._db is not None:
+            row = self._db.execute("SELECT response FROM prompts WHERE hash = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            data = row[0]
+            self._remember(key, data)
+        else:
+            return None
+        return orjson.loads(data)
+    
+    def put(self, prompt: str, response: Dict[str, Any], system: Optional[str] = None) -> None:
+        """
+        Store the parsed response for a prompt.
+        
+        Args:
+            prompt: The prompt sent to the LLM
+            response: The parsed LLM response
+            system: Optional system prompt sent with it
+        """
+        if self.maxsize <= 0:
+            return
+        key = self.key(prompt, system)
+        data = orjson.dumps(response)
+        self._remember(key, data)
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO prompts (hash, response) VALUES (?, ?)", (key, data))
+            self._db.commit()
+    
+    def _remember(self, key: str, data: bytes) -> None:
+        """Insert an entry into the in-memory LRU, evicting the oldest if full."""
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+prompt_cache = PromptCache(maxsize=LLM_CACHE_SIZE, path=LLM_CACHE_PATH)
+
+class SemanticCache:
+    """
+    Cache of parsed LLM responses looked up by embedding similarity.
+    
+    Prompts are embedded with the Gemini embedding model and normalized, so a
+    dot product gives their cosine similarity. A stored response is returned
+    when the best match reaches the threshold and has not expired. Only the
+    variable (user) prompt is embedded; entries are partitioned by a
+    namespace, typically a hash of the system prompt, so prompts sent with
+    different instructions never match each other.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        ttl: float = 3600.0,
+        maxsize: int = 256,
+        model: str = EMBEDDING_MODEL,
+    ):
+        """
+        Initialize the semantic cache.
+        
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            ttl: Seconds an entry stays valid
+            maxsize: Maximum number of entries kept
+            model: Embedding model used for prompts
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.model = model
+        self._vectors: List[List[float]] = []
+        self._namespaces: List[str] = []
+        self._payloads: List[bytes] = []
+        self._expires: List[float] = []
+    
+    async def embed(self, text: str) -> List[float]:
+        """
+        Embed text and normalize it to unit length.
+        
+        The request holds an LLMExecutor slot, so embeddings count towards
+        the same concurrency and rate limits as generation requests.
+        
+        Args:
+            text: The text to embed
+            
+        Returns:
+            The normalized embedding vector
+        """
+        client = _get_async_client()
+        async with _get_executor().slot():
+            response = await client.models.embed_content(model=self.model, contents=text)
+        values = response.embeddings[0].values
+        norm = math.sqrt(math.sumprod(values, values)) or 1.0
+        return [v / norm for v in values]
+    
+    def get(self, embedding: List[float], namespace: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Find the cached response most similar to an embedding.
+        
+        Args:
+            embedding: Normalized embedding of the prompt
+            namespace: Only entries stored under this namespace can match
+            
+        Returns:
+            The parsed response, or None if nothing is similar enough
+        """
+        self._evict_expired()
+        best_score, best_index = self.threshold, -1
+        for i, vector in enumerate(self._vectors):
+            if self._namespaces[i] != namespace:
+                continue
+            score = math.sumprod(vector, embedding)
+            if score >= best_score:
+                best_score, best_index = score, i
+        if best_index < 0:
+            return None
+        return orjson.loads(self._payloads[best_index])
+    
+    def put(self, embedding: List[float], response: Dict[str, Any], namespace: str = "") -> None:
+        """
+        Store a response under a prompt embedding.
+        
+        Args:
+            embedding: Normalized embedding of the prompt
+            response: The parsed LLM response
+            namespace: Namespace the entry belongs to
+        """
+        self._vectors.append(embedding)
+        self._namespaces.append(namespace)
+        self._payloads.append(orjson.dumps(response))
+        self._expires.append(time.monotonic() + self.ttl)
+        if len(self._vectors) > self.maxsize:
+            del self._vectors[0], self._namespaces[0], self._payloads[0], self._expires[0]
+    
+    def _evict_expired(self) -> None:
+        """Drop entries whose TTL has passed (entries are in insertion order)."""
+        now = time.monotonic()
+        expired = 0
+        while expired < len(self._expires) and self._expires[expired] <= now:
+            expired += 1
+        if expired:
+            del self._vectors[:expired], self._namespaces[:expired]
+            del self._payloads[:expired], self._expires[:expired]
+
+semantic_cache = (
+    SemanticCache(threshold=LLM_SEMANTIC_CACHE_THRESHOLD, ttl=LLM_SEMANTIC_CACHE_TTL)
+    if LLM_SEMANTIC_CACHE
+    else None
+)
+
+def call_llm(
+    prompt: str,
+    system: Optional[str] = None,
+    validate: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Call the LLM with a prompt and return the parsed JSON response.
+    
+    Args:
+        prompt: The prompt to send to the LLM
+        system: Optional system prompt; static instructions belong here so
+            the provider can cache them as a shared prefix
+        validate: Optional check run on the parsed response before it is
+            cached; it returns the (possibly repaired) response, or raises
+            ValueError so that a malformed response is never cached
+    Returns:
+        Dictionary containing the parsed JSON response
+    """
+    cached = prompt_cache.get(prompt, system)
+    if cached is not None:
+        return cached
+    response = _get_sync_client().models.generate_content(
+        model=MODEL,
+        contents=_build_contents(prompt),
+        config=_build_config(system),
     )
     response_text = response.text
-    return _parse_llm_response(response_text)
+    parsed = _parse_llm_response(response_text)
+    if validate is not None:
+        parsed = validate(parsed)
+    if not (isinstance(parsed, dict) and parsed.get(TRUNCATED_KEY)):
+        prompt_cache.put(prompt, parsed, system)
+    return parsed
+
+class LLMExecutor:
+    """
+    Admission control shared by every LLM request made from one event loop.
+    
+    Requests wait for one of max_concurrency slots, then for a token from a
+    token bucket refilled at max_rps per second, so all callers together
+    stay under the provider's concurrency and rate limits. Waiters are
+    admitted in FIFO order.
+    """
+    
+    def __init__(self, max_concurrency: int = 8, max_rps: float = 0):
+        """
+        Initialize the executor.
+        
+        Args:
+            max_concurrency: Maximum requests in flight at once
+            max_rps: Maximum requests started per second (0 means unlimited)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_rps = max_rps
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._rate_lock = asyncio.Lock()
+        self._capacity = max(max_rps, 1.0)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+    
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a request slot for the duration of the block."""
+        async with self._semaphore:
+            await self._take_token()
+            yield
+    
+    async def _take_token(self) -> None:
+        """Wait until the token bucket allows another request to start."""
+        if self.max_rps <= 0:
+            return
+        async with self._rate_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.max_rps)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.max_rps)
+
+def _get_executor() -> LLMExecutor:
+    """Return the LLM executor for the running event loop."""
+    return _loop_resource("executor", lambda: LLMExecutor(LLM_MAX_CONCURRENCY, LLM_MAX_RPS))
+
+async def astream_llm(prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Stream the raw LLM response text chunk by chunk as it is generated.
+    
+    The request holds an LLMExecutor slot until the stream ends.
+    
+    Args:
+        prompt: The prompt to send to the LLM
+        system: Optional system prompt
+    Yields:
+        Successive chunks of response text
+    """
+    client = _get_async_client()
+    async with _get_executor().slot():
+        stream = await client.models.generate_content_stream(
+            model=MODEL,
+            contents=_build_contents(prompt),
+            config=_build_config(system),
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+async def acall_llm(
+    prompt: str,
+    system: Optional[str] = None,
+    stream: bool = False,
+    validate: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Asynchronously call the LLM with a prompt and return the parsed JSON response.
+    
+    Unlike call_llm this does not block the event loop, so concurrent flows
+    overlap their requests. Requests are admitted through the loop's
+    LLMExecutor (LLM_MAX_CONCURRENCY in flight, LLM_MAX_RPS per second).
+    Responses are served from prompt_cache when the exact same prompt has
+    been seen before, and from semantic_cache (if enabled) when a
+    sufficiently similar one has. Identical prompts requested concurrently
+    share a single request.
+    
+    Args:
+        prompt: The prompt to send to the LLM
+        system: Optional system prompt; static instructions belong here so
+            the provider can cache them as a shared prefix
+        stream: Stream the response, echoing it to stdout as it arrives
+        validate: Optional check run on the parsed response before it is
+            cached; it returns the (possibly repaired) response, or raises
+            ValueError so that a malformed response is never cached
+    Returns:
+        Dictionary containing the parsed JSON response
+    """
+    cached = prompt_cache.get(prompt, system)
+    if cached is not None:
+        return cached
+    
+    key = PromptCache.key(prompt, system)
+    inflight = _loop_resource("inflight", dict)
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = asyncio.ensure_future(_acall_llm_uncached(prompt, system, stream, validate))
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+        return await asyncio.shield(task)
+    # Another caller is already waiting on this prompt; callers may modify
+    # the response, so give this one its own copy
+    return orjson.loads(orjson.dumps(await asyncio.shield(task)))
+
+async def _acall_llm_uncached(
+    prompt: str,
+    system: Optional[str],
+    stream: bool,
+    validate: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """Send a prompt that missed the exact-match cache, and cache the response once it validates."""
+    embedding = None
+    if semantic_cache is not None:
+        namespace = PromptCache.key("", system)
+        # The semantic cache is only an optimization: if embedding or the
+        # lookup fails, treat it as a miss and send the prompt anyway
+        try:
+            embedding = await semantic_cache.embed(prompt)
+            cached = semantic_cache.get(embedding, namespace)
+        except Exception:
+            embedding = cached = None
+        if cached is not None:
+            return cached
+    parsed = None
+    if stream:
+        chunks = []
+        decoder = _StreamingJSON()
+        async for text in astream_llm(prompt, system):
+            sys.stdout.write(text)
+            chunks.append(text)
+            # Flushing is a write syscall, so only do it every 16 chunks or
+            # at the end of a line
+            if len(chunks) % 16 == 0 or "\n" in text:
+                sys.stdout.flush()
+            decoder.feed(text)
+        print(flush=True)
+        parsed = decoder.result()
+        if parsed is None:
+            response_text = "".join(chunks)
+    else:
+        client = _get_async_client()
+        async with _get_executor().slot():
+            response = await client.models.generate_content(
+                model=MODEL,
+                contents=_build_contents(prompt),
+                config=_build_config(system),
+            )
+        response_text = response.text
+    if parsed is None:
+        parsed = _parse_llm_response(response_text)
+    if validate is not None:
+        parsed = validate(parsed)
+    # A repaired response is used once, but the prompt is sent again next time
+    if not (isinstance(parsed, dict) and parsed.get(TRUNCATED_KEY)):
+        prompt_cache.put(prompt, parsed, system)
+        if embedding is not None:
+            semantic_cache.put(embedding, parsed, namespace)
+    return parsed
+
+class _StreamingJSON:
+    """
+    Incremental JSON decoder fed with a response as it streams in.
+    
+    Each chunk is parsed (by ijson's C backend, when available) while the
+    next one is still being generated, so a well-formed response is already
+    decoded when the stream ends. Anything it rejects, such as prose or
+    code fences around the JSON, is left to _parse_llm_response.
+    """
+    
+    def __init__(self):
+        self._values = ijson.sendable_list()
+        self._coro = ijson.items_coro(self._values, "", use_float=True)
+        self.failed = False
+    
+    def feed(self, text: str) -> None:
+        """
+        Parse the next chunk of the response.
+        
+        Args:
+            text: The chunk's text
+        """
+        if not self.failed:
+            try:
+                self._coro.send(text.encode("utf-8"))
+            except ijson.JSONError:
+                self.failed = True
+    
+    def result(self) -> Optional[Dict[str, Any]]:
+        """
+        Finish parsing.
+        
+        Returns:
+            The decoded object, or None if the response was not a single
+            well-formed JSON object
+        """
+        if not self.failed:
+            try:
+                self._coro.close()
+            except ijson.JSONError:
+                self.failed = True
+        if self.failed or len(self._values) != 1 or not isinstance(self._values[0], dict):
+            return None
+        return self._values[0]
 
 def _parse_llm_response(response_text: str) -> Dict[str, Any]:
     """
     Parse LLM response with multiple fallback strategies.
     
+    A response cut off mid-object is closed and parsed, but marked with
+    TRUNCATED_KEY so callers can tell that its last values may be incomplete.
+    
     Args:
         response_text: Raw response text from LLM
         
@@ -56,63 +642,65 @@ def _parse_llm_response(response_text: str) -> Dict[str, Any]:
     Raises:
         ValueError: If no valid JSON/YAML can be extracted
     """
+    # Strategy 1: Try to parse as JSON directly. This is the usual case with
+    # response_mime_type="application/json", and orjson skips surrounding
+    # whitespace itself, so the text is not copied by strip() first.
+    try:
+        return orjson.loads(response_text)
+    except orjson.JSONDecodeError:
+        pass
+    
     # Clean the response text
     response_text = response_text.strip()
     
-    # Strategy 1: Try to parse as JSON directly
-    try:
-        return json.loads(response_text)
-    except json.JSONDecodeError:
-        pass
+    # The first code block and its lowercased tag, found in one search and
+    # shared by strategies 2 and 5
+    fence = _FENCE_RE.search(response_text)
+    fence_tag = fence.group(1) and fence.group(1).lower() if fence else None
     
     # Strategy 2: Extract JSON from code block
     try:
-        json_match = re.search(r'```(?:json)?\\s*({[\\s\\S]*?})\\s*```', response_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group(1))
-    except (json.JSONDecodeError, AttributeError):
+        if fence and fence_tag in (None, "json") and fence.group(2).startswith("{"):
+            return orjson.loads(fence.group(2))
+    except orjson.JSONDecodeError:
         pass
     
     # Strategy 3: Extract the first JSON object
     try:
-        # Find the first '{' and last '}'
         start = response_text.find('{')
         if start != -1:
-            # Count braces to find matching closing brace
-            brace_count = 0
-            for i, char in enumerate(response_text[start:], start):
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        json_str = response_text[start:i+1]
-                        return json.loads(json_str)
-    except json.JSONDecodeError:
+            object_text, truncated = _scan_json_object(response_text, start)
+            parsed = orjson.loads(object_text)
+            if truncated and isinstance(parsed, dict):
+                parsed[TRUNCATED_KEY] = True
+            return parsed
+    except orjson.JSONDecodeError:
         pass
     
     # Strategy 4: Try YAML parsing
     try:
-        return yaml.safe_load(response_text)
+        return yaml.load(response_text, Loader=YamlLoader)
     except yaml.YAMLError:
         pass
     
-    # Strategy 5: Extract YAML from code block
+    # Strategy 5: Extract YAML from code block. Almost any text is valid YAML,
+    # so only a mapping counts as a parsed response
     try:
-        yaml_match = re.search(r'```(?:yaml)?\\s*([\\s\\S]*?)\\s*```', response_text, re.DOTALL)
-        if yaml_match:
-            return yaml.safe_load(yaml_match.group(1))
-    except (yaml.YAMLError, AttributeError):
+        if fence and fence_tag in (None, "yaml", "yml"):
+            parsed = yaml.load(fence.group(2), Loader=YamlLoader)
+            if isinstance(parsed, dict):
+                return parsed
+    except yaml.YAMLError:
         pass
     
     # Strategy 6: Try to find and parse any valid JSON object
     try:
         # Look for any JSON object in the text
-        objects = re.findall(r'{[^{}]*(?:{[^{}]*}[^{}]*)*}', response_text)
+        objects = _JSON_OBJECT_RE.findall(response_text)
         for obj_str in objects:
             try:
-                return json.loads(obj_str)
-            except json.JSONDecodeError:
+                return orjson.loads(obj_str)
+            except orjson.JSONDecodeError:
                 continue
     except Exception:
         pass
@@ -122,10 +710,156 @@ def _parse_llm_response(response_text: str) -> Dict[str, Any]:
     raise ValueError(f"Failed to parse LLM response. Attempted multiple parsing strategies.\
 Response sample: {sample}")
 
-def format_plan(plan: List[Dict[str, Any]], indent: int = 0) -> str:
+def _scan_json_object(text: str, start: int) -> Tuple[str, bool]:
+    """
+    Cut the JSON object starting at text[start] out of the text around it.
+    
+    Scans once, a token at a time, so strings and runs of other values are
+    skipped by the regex engine rather than character by character. Braces
+    inside strings are ignored and trailing commas before a closing bracket
+    are dropped. If the text ends before the object does (a
+    truncated response), the open string and brackets are closed.
+    
+    Args:
+        text: Text containing the object
+        start: Index of the object's opening brace
+        
+    Returns:
+        The object's JSON text, repaired where needed, and whether it was
+        truncated (so its last values may be incomplete)
+    """
+    closers = []
+    drop = []  # indexes of trailing commas to leave out
+    last_comma = -1
+    in_string = False
+    end = len(text)
+    for token in _JSON_TOKEN_RE.finditer(text, start):
+        char = token.group()[0]
+        if char == '"':
+            # A whole string, or the rest of the text if it is never closed
+            in_string = token.group(1) is None
+            last_comma = -1
+        elif char == '{' or char == '[':
+            closers.append('}' if char == '{' else ']')
+            last_comma = -1
+        elif char == '}' or char == ']':
+            if last_comma != -1:
+                drop.append(last_comma)
+                last_comma = -1
+            if closers:
+                closers.pop()
+            if not closers:
+                end = token.end()
+                break
+        elif char == ',':
+            last_comma = token.start()
+        else:
+            last_comma = -1
+    
+    pieces = []
+    pos = start
+    for i in drop:
+        pieces.append(text[pos:i])
+        pos = i + 1
+    if closers:
+        # Truncated: close what is still open
+        if last_comma != -1:
+            pieces.append(text[pos:last_comma])
+            pos = end
+        pieces.append(text[pos:end])
+        if in_string:
+            pieces.append('"')
+        pieces.extend(reversed(closers))
+    else:
+        pieces.append(text[pos:end])
+    return "".join(pieces), bool(closers)
+
+@dataclass(slots=True)
+class PlanStep:
+    """A step of a thought's plan, as validated from the LLM response."""
+    description: str
+    status: str
+    result: Optional[str] = None
+    query: Optional[str] = None
+    mark: Optional[str] = None
+    sub_steps: List["PlanStep"] = field(default_factory=list)
+    
+    @classmethod
+    def from_dict(cls, step: Dict[str, Any]) -> "PlanStep":
+        """
+        Build a plan step, and its sub-steps, from its JSON form.
+        
+        The tree is built with an explicit stack rather than by recursion,
+        so deeply nested plans cost no extra call frames.
+        
+        Args:
+            step: A validated plan step from the LLM response
+            
+        Returns:
+            The PlanStep
+        """
+        def build(data: Dict[str, Any]) -> "PlanStep":
+            return cls(
+                description=data["description"],
+                # Statuses come from a small fixed set; interning them lets
+                # every step share one string per status, and makes status
+                # comparisons hit str's identity fast path
+                status=sys.intern(data["status"]),
+                result=data.get("result"),
+                query=data.get("query"),
+                mark=data.get("mark"),
+            )
+        
+        root = build(step)
+        stack = [(step, root)]
+        while stack:
+            data, plan_step = stack.pop()
+            for sub_data in data.get("sub_steps") or ():
+                sub_step = build(sub_data)
+                plan_step.sub_steps.append(sub_step)
+                stack.append((sub_data, sub_step))
+        return root
+
+
+@dataclass(slots=True)
+class Thought:
+    """One validated LLM response in a chain of thought."""
+    thought_number: int
+    current_thinking: str
+    planning: List[PlanStep]
+    next_thought_needed: bool
+    final_answer: Optional[str] = None
+    
+    @classmethod
+    def from_dict(cls, response: Dict[str, Any], thought_number: int) -> "Thought":
+        """
+        Build a thought from a validated LLM response.
+        
+        Args:
+            response: The validated LLM response
+            thought_number: Position of the thought in the chain, from 1
+            
+        Returns:
+            The Thought
+        """
+        return cls(
+            thought_number=thought_number,
+            current_thinking=response["current_thinking"],
+            planning=[PlanStep.from_dict(step) for step in response["planning"]],
+            next_thought_needed=response["next_thought_needed"],
+            final_answer=response.get("final_answer"),
+        )
+
+# Indentation for each plan depth that format_plan is likely to see
+_INDENTS = tuple("  " * level for level in range(32))
+
+def format_plan(plan: List[PlanStep], indent: int = 0) -> str:
     """
     Format a plan structure into a readable string representation.
     
+    Steps are visited depth-first with an explicit stack, so the whole plan
+    is built into one list of lines and joined once.
+    
     Args:
         plan: The plan structure to format
         indent: Current indentation level
@@ -133,38 +867,36 @@ def format_plan(plan: List[Dict[str, Any]], indent: int = 0) -> str:
     Returns:
         Formatted string representation of the plan
     """
-    if not plan:
-        return ""
-        
     result = []
-    indent_str = "  " * indent
+    stack = [(step, indent) for step in reversed(plan)]
     
-    for step in plan:
+    while stack:
+        step, level = stack.pop()
+        indent_str = _INDENTS[level] if level < len(_INDENTS) else "  " * level
+        
         # Format the main step
-        status = step.get("status", "Unknown")
-        result.append(f"{indent_str}- {step.get('description', 'No description')} [{status}]")
+        status = step.status or "Unknown"
+        result.append(f"{indent_str}- {step.description or 'No description'} [{status}]")
         
         # Add result if available
-        if step.get("result"):
-            result.append(f"{indent_str}  Result: {step['result']}")
+        if step.result:
+            result.append(f"{indent_str}  Result: {step.result}")
             
         # Add query if search needed
-        if status == "Search Needed" and step.get("query"):
-            result.append(f"{indent_str}  Query: {step['query']}")
+        if status == "Search Needed" and step.query:
+            result.append(f"{indent_str}  Query: {step.query}")
             
         # Add mark if verification needed
-        if status == "Verification Needed" and step.get("mark"):
-            result.append(f"{indent_str}  Mark: {step['mark']}")
+        if status == "Verification Needed" and step.mark:
+            result.append(f"{indent_str}  Mark: {step.mark}")
             
-        # Format sub-steps if available
-        if step.get("sub_steps"):
-            sub_plan_str = format_plan(step["sub_steps"], indent + 1)
-            if sub_plan_str:
-                result.append(sub_plan_str)
+        # Queue sub-steps so they are formatted next, in order
+        if step.sub_steps:
+            stack.extend((sub_step, level + 1) for sub_step in reversed(step.sub_steps))
     
     return "\n".join(result)
 
-def format_plan_for_prompt(plan: List[Dict[str, Any]]) -> str:
+def format_plan_for_prompt(plan: List[PlanStep]) -> str:
     """
     Format a plan structure specifically for inclusion in an LLM prompt.
     